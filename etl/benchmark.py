@@ -0,0 +1,348 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import transformation
+from transformation import PESOS_CNPJ_PRIMEIRO, PESOS_CNPJ_SEGUNDO, DESCRICAO_DESPESAS
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Tamanho aproximado de um ano real de demonstracoes contabeis da ANS (escala 1x)
+LINHAS_TRIMESTRE_1X = 700_000
+OPERADORAS_PADRAO = 1_100
+BLOCO_GERACAO = 1_000_000
+INTERVALO_AMOSTRA_MEMORIA = 0.01
+
+MODALIDADES = [
+    "Medicina de Grupo", "Cooperativa Médica", "Odontologia de Grupo",
+    "Autogestão", "Seguradora Especializada em Saúde", "Administradora de Benefícios",
+]
+UFS = ["SP", "RJ", "MG", "PR", "RS", "SC", "BA", "PE", "GO", "DF", "CE", "ES"]
+DESCRICOES = [
+    DESCRICAO_DESPESAS,
+    f"{DESCRICAO_DESPESAS.upper()} - JUDICIAL",
+    "Contraprestações Efetivas de Operações de Planos de Assistência à Saúde",
+    "Receitas com Operações de Assistência à Saúde",
+    "Despesas Administrativas",
+    "Provisões Técnicas de Operações de Assistência à Saúde",
+]
+# Proporcao de linhas de cada DESCRICAO acima (as duas primeiras passam no filtro da transformacao)
+PESOS_DESCRICOES = [0.08, 0.02, 0.3, 0.3, 0.2, 0.1]
+
+
+def gerar_cnpjs(rng: np.random.Generator, quantidade: int, proporcao_invalidos: float = 0.02) -> np.ndarray:
+    """Funcao responsavel por gerar CNPJs com digitos verificadores validos, com uma parte propositalmente invalida."""
+    base = rng.integers(0, 10, size=(quantidade, 12))
+
+    primeiro = (base @ PESOS_CNPJ_PRIMEIRO) % 11
+    primeiro = np.where(primeiro < 2, 0, 11 - primeiro)
+    com_primeiro = np.column_stack([base, primeiro])
+
+    segundo = (com_primeiro @ PESOS_CNPJ_SEGUNDO) % 11
+    segundo = np.where(segundo < 2, 0, 11 - segundo)
+    digitos = np.column_stack([com_primeiro, segundo])
+
+    invalidos = rng.random(quantidade) < proporcao_invalidos
+    digitos[invalidos, 13] = (digitos[invalidos, 13] + 1) % 10
+
+    return np.array(["".join(map(str, linha)) for linha in digitos])
+
+
+def gerar_cadastro(pasta_csv: str, rng: np.random.Generator, operadoras: int = OPERADORAS_PADRAO) -> np.ndarray:
+    """Funcao responsavel por gravar um Relatorio_cadop.csv sintetico e devolver os registros ANS gerados."""
+    registros = rng.choice(np.arange(300_000, 500_000), size=operadoras, replace=False).astype(str)
+
+    df_cadop = pd.DataFrame({
+        "REGISTRO_OPERADORA": registros,
+        "CNPJ": gerar_cnpjs(rng, operadoras),
+        "Razao_Social": [f"OPERADORA SINTETICA {i} LTDA" for i in range(operadoras)],
+        "Nome_Fantasia": "",
+        "Modalidade": rng.choice(MODALIDADES, size=operadoras),
+        "Logradouro": "RUA SINTETICA",
+        "Numero": "100",
+        "Complemento": "",
+        "Bairro": "CENTRO",
+        "Cidade": "São Paulo",
+        "UF": rng.choice(UFS, size=operadoras),
+        "CEP": "01000000",
+        "DDD": "11",
+        "Telefone": "30000000",
+        "Fax": "",
+        "Endereco_eletronico": "contato@sintetica.com.br",
+        "Representante": "REPRESENTANTE SINTETICO",
+        "Cargo_Representante": "DIRETOR",
+        "Regiao_de_Comercializacao": "4",
+        "Data_Registro_ANS": "2010-01-01",
+    })
+    df_cadop.to_csv(os.path.join(pasta_csv, "Relatorio_cadop.csv"), sep=";", index=False, encoding="utf-8")
+    return registros
+
+
+def gerar_trimestre(file_path: str, rng: np.random.Generator, registros: np.ndarray, ano: int, trimestre: int, linhas: int):
+    """Funcao responsavel por gravar um arquivo trimestral no layout DATA;REG_ANS;...;DESCRICAO;...;VL_SALDO_FINAL."""
+    # Cerca de 1% dos registros nao existe no cadastro, como acontece com operadoras canceladas
+    desconhecidos = rng.choice(np.arange(600_000, 700_000), size=max(1, len(registros) // 100)).astype(str)
+    universo = np.concatenate([registros, desconhecidos])
+    data = f"{ano}-{(trimestre - 1) * 3 + 1:02d}-01"
+
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write("DATA;REG_ANS;CD_CONTA_CONTABIL;DESCRICAO;VL_SALDO_INICIAL;VL_SALDO_FINAL\n")
+
+    restantes = linhas
+    while restantes > 0:
+        tamanho = min(BLOCO_GERACAO, restantes)
+        valores = np.round(rng.lognormal(11, 2, size=tamanho), 2)
+        negativos = rng.random(tamanho) < 0.03
+        valores[negativos] *= -1
+
+        df = pd.DataFrame({
+            "DATA": data,
+            "REG_ANS": rng.choice(universo, size=tamanho),
+            "CD_CONTA_CONTABIL": rng.integers(10_000, 99_999, size=tamanho),
+            "DESCRICAO": rng.choice(DESCRICOES, size=tamanho, p=PESOS_DESCRICOES),
+            "VL_SALDO_INICIAL": np.round(valores * 0.9, 2),
+            "VL_SALDO_FINAL": valores,
+        })
+        df.to_csv(file_path, sep=";", decimal=",", index=False, header=False, mode="a", encoding="utf-8")
+        restantes -= tamanho
+
+
+def gerar_dados_sinteticos(destino: str, escala: float, ano: int = 2025, operadoras: int = OPERADORAS_PADRAO, semente: int = 42) -> int:
+    """Funcao responsavel por gerar um ano sintetico de dados da ANS em destino/csv. Retorna o total de linhas."""
+    rng = np.random.default_rng(semente)
+    pasta_csv = os.path.join(destino, "csv")
+    os.makedirs(pasta_csv, exist_ok=True)
+
+    registros = gerar_cadastro(pasta_csv, rng, operadoras)
+    linhas = int(LINHAS_TRIMESTRE_1X * escala)
+
+    for trimestre in range(1, 5):
+        print(f"Gerando {trimestre}T{ano}.csv ({linhas} linhas)...")
+        gerar_trimestre(os.path.join(pasta_csv, f"{trimestre}T{ano}.csv"), rng, registros, ano, trimestre, linhas)
+
+    return linhas * 4
+
+
+def apontar_transformacao_para(destino: str):
+    """Funcao responsavel por redirecionar as entradas e saidas da transformacao para a pasta sintetica."""
+    pasta_csv = os.path.join(destino, "csv")
+    pasta_zip = os.path.join(destino, "zip")
+    os.makedirs(pasta_zip, exist_ok=True)
+
+    transformation.FILE_CSV_FOLDER = pasta_csv
+    transformation.FILE_ZIP_FOLDER = pasta_zip
+    transformation.FILE_ZIP_ARCHIVE = os.path.join(pasta_zip, "consolidado_despesas.zip")
+    transformation.FILE_OPERADORAS = os.path.join(pasta_csv, "Relatorio_cadop.csv")
+    transformation.FILE_METRICAS = os.path.join(pasta_csv, "despesas_agregadas.csv")
+    transformation.FILE_OPERADORAS_ATIVAS = os.path.join(pasta_csv, "operadoras_ativas.csv")
+    transformation.FILE_INACTIVE_OPERADORAS = os.path.join(pasta_csv, "operadoras_inativas.csv")
+    transformation.FOLDER_INCREMENTAL = os.path.join(destino, "incremental")
+    transformation.FOLDER_PARQUET = os.path.join(destino, "parquet")
+    transformation.FOLDER_CACHE = os.path.join(destino, "cache")
+
+
+def ler_rss_atual() -> int:
+    """Funcao responsavel por ler o RSS atual do processo em bytes (Linux); fora dele usa o pico do processo."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        # resource nao existe no Windows; ru_maxrss vem em KB no Linux e em bytes no macOS
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico if sys.platform == "darwin" else pico * 1024
+
+
+class MonitorMemoria(threading.Thread):
+    """Amostra o RSS do processo em segundo plano e guarda o maior valor visto durante uma etapa"""
+
+    def __init__(self, intervalo: float = INTERVALO_AMOSTRA_MEMORIA):
+        super().__init__(daemon=True)
+        self.intervalo = intervalo
+        self.pico = ler_rss_atual()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.is_set():
+            self.pico = max(self.pico, ler_rss_atual())
+            self._parar.wait(self.intervalo)
+
+    def parar(self) -> int:
+        self._parar.set()
+        self.join()
+        self.pico = max(self.pico, ler_rss_atual())
+        return self.pico
+
+
+def medir_etapa(nome: str, funcao, linhas) -> dict:
+    """Funcao responsavel por executar uma etapa medindo tempo, vazao (linhas/s) e pico de memoria.
+
+    linhas pode ser um numero ou uma funcao que recebe o retorno da etapa. O pico e o RSS
+    do processo principal durante a etapa, junto com quanto ele cresceu em relacao ao inicio
+    da etapa (workers do modo paralelo nao entram na conta).
+    """
+    gc.collect()
+    rss_inicial = ler_rss_atual()
+    monitor = MonitorMemoria()
+    monitor.start()
+
+    inicio = time.perf_counter()
+    try:
+        retorno = funcao()
+    finally:
+        tempo = time.perf_counter() - inicio
+        pico = monitor.parar()
+
+    total_linhas = linhas(retorno) if callable(linhas) else linhas
+    resultado = {
+        "etapa": nome,
+        "linhas": int(total_linhas),
+        "tempo_s": round(tempo, 4),
+        "linhas_por_s": round(total_linhas / tempo, 1) if tempo > 0 else None,
+        "pico_memoria_mb": round(pico / 1024 / 1024, 1),
+        "memoria_adicional_mb": round(max(pico - rss_inicial, 0) / 1024 / 1024, 1),
+    }
+    print(
+        f"{nome:<38} {resultado['linhas']:>12} linhas {tempo:>9.2f}s {resultado['linhas_por_s'] or 0:>14,.0f} linhas/s "
+        f"pico {resultado['pico_memoria_mb']:>8.1f} MB (+{resultado['memoria_adicional_mb']:.1f} MB)"
+    )
+    return resultado
+
+
+def medir_migracao(destino: str) -> list:
+    """Funcao responsavel por medir o migrar_sql no Postgres do docker-compose.
+
+    ATENCAO: iniciar_infraestrutura recria o schema public do banco configurado em server/database/db.py.
+    """
+    sys.path.insert(0, os.path.join(BASE_DIR, "server"))
+    from database import db
+
+    db.FILE_CSV_FOLDER = os.path.join(destino, "csv")
+    db.FILE_ZIP_FOLDER = os.path.join(destino, "zip")
+    db.FILE_PARQUET_FOLDER = os.path.join(destino, "parquet")
+    db.iniciar_infraestrutura()
+
+    linhas_consolidado = len(pd.read_csv(os.path.join(db.FILE_ZIP_FOLDER, "consolidado_despesas.zip"), sep=";", usecols=[0]))
+    return [
+        medir_etapa(
+            "migrar_sql (despesas_consolidadas)",
+            lambda: db.migrar_sql("consolidado_despesas.zip", "despesas_consolidadas"),
+            linhas_consolidado
+        ),
+        medir_etapa(
+            "migrar_sql (operadoras)",
+            lambda: db.migrar_sql("operadoras_ativas.csv", "operadoras"),
+            len(pd.read_csv(os.path.join(db.FILE_CSV_FOLDER, "operadoras_ativas.csv"), sep=";", usecols=[0]))
+        ),
+    ]
+
+
+def executar_benchmark(escala: float, destino: str, ano: int, modos: list, banco: bool) -> list:
+    """Funcao responsavel por gerar os dados de uma escala e medir cada etapa do ETL sobre eles."""
+    print(f"\n=== Escala {escala}x em {destino} ===")
+    total_linhas = gerar_dados_sinteticos(destino, escala, ano)
+    apontar_transformacao_para(destino)
+
+    resultados = []
+    resultados.append(medir_etapa(
+        "carregar_cadastro_operadoras", transformation.carregar_cadastro_operadoras, len
+    ))
+    resultados.append(medir_etapa(
+        "carregar_indice_cadastro (sem cache)", transformation.carregar_indice_cadastro, len
+    ))
+    transformation._indice_cadastro["chave"] = None
+    resultados.append(medir_etapa(
+        "carregar_indice_cadastro (cache)", transformation.carregar_indice_cadastro, len
+    ))
+    resultados.append(medir_etapa(
+        "analisando_inconsistencia", lambda: transformation.analisando_inconsistencia(ano), total_linhas
+    ))
+
+    opcoes_modos = {
+        "padrao": {},
+        "blocos": {"chunksize": transformation.CHUNKSIZE_PADRAO},
+        "paralelo": {"workers": os.cpu_count()},
+    }
+    for modo in modos:
+        resultados.append(medir_etapa(
+            f"consolidando_dados ({modo})",
+            lambda: transformation.consolidando_dados(ano, **opcoes_modos[modo]),
+            total_linhas
+        ))
+
+    df_totalizado = transformation.totalizar_despesas(transformation.analisando_inconsistencia(ano))
+    resultados.append(medir_etapa(
+        "processar_metricas", lambda: transformation.processar_metricas(df_totalizado), len(df_totalizado)
+    ))
+
+    if banco:
+        try:
+            resultados.extend(medir_migracao(destino))
+        except Exception as e:
+            print(f"migrar_sql nao medido, banco indisponivel: {e}")
+
+    for resultado in resultados:
+        resultado["escala"] = escala
+    return resultados
+
+
+def comparar_resultados(resultados: list, referencia_path: str, tolerancia: float) -> bool:
+    """Funcao responsavel por comparar com uma execucao anterior e apontar etapas mais lentas que a tolerancia."""
+    with open(referencia_path, "r", encoding="utf-8") as f:
+        referencia = {(r["escala"], r["etapa"]): r for r in json.load(f)}
+
+    ok = True
+    for resultado in resultados:
+        anterior = referencia.get((resultado["escala"], resultado["etapa"]))
+        if not anterior or not anterior.get("tempo_s"):
+            continue
+
+        variacao = (resultado["tempo_s"] - anterior["tempo_s"]) / anterior["tempo_s"]
+        if variacao > tolerancia:
+            ok = False
+            print(f"REGRESSAO: {resultado['etapa']} ({resultado['escala']}x) {variacao:+.0%} de tempo")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das etapas do ETL com dados sinteticos da ANS")
+    parser.add_argument("--escalas", type=float, nargs="+", default=[1], help="Multiplos de um ano real (ex: 1 10 50)")
+    parser.add_argument("--ano", type=int, default=2025)
+    parser.add_argument("--destino", help="Pasta para os dados gerados (padrao: pasta temporaria)")
+    parser.add_argument("--modos", nargs="+", default=["padrao"], choices=["padrao", "blocos", "paralelo"])
+    parser.add_argument("--banco", action="store_true", help="Mede tambem o migrar_sql (recria o schema do banco!)")
+    parser.add_argument("--saida", help="Grava os resultados em JSON")
+    parser.add_argument("--comparar", help="JSON de uma execucao anterior para detectar regressao")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Aumento de tempo aceito no --comparar (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    resultados = []
+    for escala in args.escalas:
+        if args.destino:
+            destino = os.path.join(args.destino, f"escala_{escala:g}x")
+            resultados.extend(executar_benchmark(escala, destino, args.ano, args.modos, args.banco))
+        else:
+            with tempfile.TemporaryDirectory(prefix=f"ans_{escala:g}x_") as destino:
+                resultados.extend(executar_benchmark(escala, destino, args.ano, args.modos, args.banco))
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+        print(f"\nResultados gravados em {args.saida}")
+
+    if args.comparar and not comparar_resultados(resultados, args.comparar, args.tolerancia):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,21 @@
 import asyncio
 from playwright.async_api import async_playwright
-from typing import List
+from email.utils import formatdate
+from html.parser import HTMLParser
+from typing import List, Optional
 from pathlib import Path
+from urllib.parse import urljoin, unquote
+import json
 import os
+import time
 
+import requests
+from requests.adapters import HTTPAdapter
 import zipfile
 
 
 # CONFIGURACAO DE ROTAS
-URL_BASE = "https://dadosabertos.ans.gov.br/FTP/PDA"
+URL_BASE = os.getenv("ANS_URL_BASE", "https://dadosabertos.ans.gov.br/FTP/PDA")
 URL_DEMONSTRACOES = f"{URL_BASE}/demonstracoes_contabeis"
 URL_OPERADORAS = f"{URL_BASE}/operadoras_de_plano_de_saude_ativas"
 
@@ -17,7 +24,17 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 FILE_ZIP_FOLDER = os.path.join(BASE_DIR, "data","zip")
 FILE_CSV_FOLDER = os.path.join(BASE_DIR, "data","csv")
+FILE_DOWNLOAD_MANIFEST = os.path.join(BASE_DIR, "data", "downloads.json")
 
+# "http" baixa direto pela listagem do PDA; "navegador" usa o Playwright como antes
+MODO_DOWNLOAD = os.getenv("MODO_DOWNLOAD", "http")
+MAX_DOWNLOADS_SIMULTANEOS = int(os.getenv("MAX_DOWNLOADS_SIMULTANEOS", "4"))
+TIMEOUT_HTTP = 60
+TAMANHO_BLOCO_DOWNLOAD = 1024 * 1024
+
+
+# Os zips de demonstracoes sao lidos direto pela transformacao; True mantem a extracao em data/csv
+EXTRAIR_ZIPS = os.getenv("EXTRAIR_ZIPS", "0") == "1"
 
 os.makedirs(FILE_ZIP_FOLDER, exist_ok=True)
 os.makedirs(FILE_CSV_FOLDER, exist_ok=True)
@@ -83,11 +100,15 @@ def descompactar_arquivos_zip(file_name: str):
         print(f"{file_name} extraido em {FILE_CSV_FOLDER}")
 
 
-def compactar_arquivo_zip(file_path: str, zip_path: str):
-    """Responsavel por compactar arquivos em zip"""
+def compactar_dataframe_zip(df, file_name: str, zip_path: str):
+    """Responsavel por gravar um DataFrame como CSV direto dentro do zip, sem arquivo temporario"""
     try:
+        info = zipfile.ZipInfo(file_name, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+
         with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            zipf.write(file_path, os.path.basename(file_path))
+            with zipf.open(info, 'w') as f:
+                df.to_csv(f, sep=";", index=False, encoding='utf-8-sig')
         print(f"Arquivo zip criado com sucesso: {zip_path}")
     except Exception as e:
         print(f"Erro ao criar zip: {e}")
@@ -106,13 +127,220 @@ async def processar_secao_ans(page, url_secao):
         for file_name in files:
             await baixar_arquivos(page, url_secao, file_name)
 
-            if file_name.lower().endswith('.zip'):
+            # A transformacao le os CSVs direto de data/zip, so extrai se pedido
+            if file_name.lower().endswith('.zip') and EXTRAIR_ZIPS:
                 descompactar_arquivos_zip(file_name)
         
     except Exception as e:
         print(f"Erro na secao {url_secao}: {e}")
 
 
+class ListagemParser(HTMLParser):
+    """Responsavel por extrair (texto, href) dos links "td a" de uma listagem de diretorio do PDA"""
+
+    def __init__(self):
+        super().__init__()
+        self.links = []
+        self._dentro_td = False
+        self._href = None
+        self._texto = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "td":
+            self._dentro_td = True
+        elif tag == "a" and self._dentro_td:
+            self._href = dict(attrs).get("href")
+            self._texto = []
+
+    def handle_endtag(self, tag):
+        if tag == "a" and self._href is not None:
+            self.links.append(("".join(self._texto).strip(), self._href))
+            self._href = None
+        elif tag == "td":
+            self._dentro_td = False
+
+    def handle_data(self, data):
+        if self._href is not None:
+            self._texto.append(data)
+
+
+def listar_links_http(session: requests.Session, url_secao: str) -> dict:
+    """Responsavel por ler a listagem de uma secao e devolver {texto do link: url absoluta}"""
+    base = url_secao if url_secao.endswith("/") else f"{url_secao}/"
+    response = session.get(base, timeout=TIMEOUT_HTTP)
+    response.raise_for_status()
+
+    parser = ListagemParser()
+    parser.feed(response.text)
+    return {texto or unquote(href): urljoin(base, href) for texto, href in parser.links}
+
+
+def carregar_manifesto_downloads() -> dict:
+    """Responsavel por ler os validadores (ETag/Last-Modified) dos arquivos ja baixados"""
+    if not os.path.exists(FILE_DOWNLOAD_MANIFEST):
+        return {}
+    try:
+        with open(FILE_DOWNLOAD_MANIFEST, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Manifesto de downloads invalido, ignorando: {e}")
+        return {}
+
+
+def salvar_manifesto_downloads(manifesto: dict):
+    tmp_path = f"{FILE_DOWNLOAD_MANIFEST}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, FILE_DOWNLOAD_MANIFEST)
+
+
+def destino_download(file_name: str) -> str:
+    if file_name.lower().endswith('.csv'):
+        return os.path.join(FILE_CSV_FOLDER, file_name)
+    return os.path.join(FILE_ZIP_FOLDER, file_name)
+
+
+def baixar_arquivo_http(session: requests.Session, url: str, file_name: str, validadores: Optional[dict] = None) -> Optional[dict]:
+    """Funcao responsavel por baixar um arquivo via HTTP com GET condicional e retomada por Range.
+
+    Retorna os novos validadores (etag, last_modified) quando o arquivo foi baixado,
+    ou None quando o servidor respondeu 304 (arquivo local ja esta atualizado).
+    """
+    final_download = destino_download(file_name)
+    parcial = f"{final_download}.part"
+    validadores = validadores if validadores is not None else {}
+    headers = {}
+
+    if os.path.exists(final_download):
+        if validadores.get("etag"):
+            headers["If-None-Match"] = validadores["etag"]
+        if validadores.get("last_modified"):
+            headers["If-Modified-Since"] = validadores["last_modified"]
+        elif not validadores.get("etag"):
+            headers["If-Modified-Since"] = formatdate(os.path.getmtime(final_download), usegmt=True)
+
+    # So retoma o .part se houver validador para o If-Range: se o arquivo mudou no servidor
+    # desde entao, ele responde 200 com o arquivo inteiro em vez de um pedaco da versao nova
+    validador_parcial = validadores.get("etag_parcial") or validadores.get("last_modified_parcial")
+    baixados = os.path.getsize(parcial) if os.path.exists(parcial) and validador_parcial else 0
+    if baixados:
+        headers["Range"] = f"bytes={baixados}-"
+        headers["If-Range"] = validador_parcial
+
+    with session.get(url, headers=headers, stream=True, timeout=TIMEOUT_HTTP) as response:
+        if response.status_code == 304:
+            print(f"Arquivo {file_name} sem alteracoes no servidor")
+            return None
+
+        if response.status_code == 416 and baixados:
+            # O .part ja contem o arquivo inteiro
+            os.replace(parcial, final_download)
+            return {"etag": validadores.get("etag_parcial"), "last_modified": validadores.get("last_modified_parcial")}
+
+        response.raise_for_status()
+
+        modo = "ab" if response.status_code == 206 else "wb"
+        if modo == "ab":
+            print(f"Retomando {file_name} a partir de {baixados} bytes")
+        else:
+            print(f"Baixando arquivo: {file_name}")
+
+        novos_validadores = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        if modo == "wb":
+            validadores["etag_parcial"] = novos_validadores["etag"]
+            validadores["last_modified_parcial"] = novos_validadores["last_modified"]
+
+        with open(parcial, modo) as f:
+            for bloco in response.iter_content(chunk_size=TAMANHO_BLOCO_DOWNLOAD):
+                f.write(bloco)
+
+    os.replace(parcial, final_download)
+    print(f"{file_name} salvo com sucesso")
+    return novos_validadores
+
+
+async def baixar_secao_http(session: requests.Session, url_secao: str, manifesto: dict, limite: asyncio.Semaphore, fila: Optional[asyncio.Queue] = None):
+    """Funcao responsavel por baixar em paralelo (limitado pelo semaforo) os arquivos de uma secao
+
+    Com uma fila informada, o caminho de cada arquivo pronto (baixado agora ou ja atualizado)
+    e colocado nela assim que fica disponivel, para ser processado sem esperar o resto da secao.
+    Se um download falhar e ja existir uma copia local completa dele, essa copia vai para a fila.
+    Retorna os arquivos que falharam sem copia local, para quem consome a secao nao gerar saidas parciais.
+    """
+    print(f"\nVerificando arquivos em: {url_secao}")
+    links = await asyncio.to_thread(listar_links_http, session, url_secao)
+    files = extrair_arquivos(list(links))
+
+    async def baixar(file_name):
+        # A entrada e atualizada pela thread do download, assim um .part interrompido
+        # fica com o validador salvo no manifesto para ser retomado na proxima execucao
+        entrada = manifesto.setdefault(file_name, {})
+        async with limite:
+            try:
+                validadores = await asyncio.to_thread(
+                    baixar_arquivo_http, session, links[file_name], file_name, entrada
+                )
+            except Exception as e:
+                print(f"Erro ao baixar arquivos\n{file_name}: {e}")
+                # O download so substitui o arquivo final quando termina, entao a copia local esta inteira
+                if fila is not None and os.path.exists(destino_download(file_name)):
+                    print(f"Usando a copia local de {file_name}")
+                    await fila.put(destino_download(file_name))
+                    return None
+                return file_name
+
+        if validadores is not None:
+            entrada.clear()
+            entrada.update(validadores)
+
+            if file_name.lower().endswith('.zip') and EXTRAIR_ZIPS:
+                descompactar_arquivos_zip(file_name)
+
+        if fila is not None:
+            await fila.put(destino_download(file_name))
+
+    falhas = await asyncio.gather(*(baixar(file_name) for file_name in files))
+    return [file_name for file_name in falhas if file_name is not None]
+
+
+def criar_sessao_http(max_downloads: int = MAX_DOWNLOADS_SIMULTANEOS) -> requests.Session:
+    """Responsavel por criar a sessao HTTP com um pool de conexoes do tamanho da concorrencia"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_downloads, pool_maxsize=max_downloads, max_retries=3)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+async def buscar_dados_ans_http(url_demonstracoes: str = URL_DEMONSTRACOES, url_operadoras: str = URL_OPERADORAS, max_downloads: int = MAX_DOWNLOADS_SIMULTANEOS):
+    """Funcao responsavel por baixar os dados da ANS direto por HTTP, sem abrir navegador"""
+    session = criar_sessao_http(max_downloads)
+
+    limite = asyncio.Semaphore(max_downloads)
+    manifesto = carregar_manifesto_downloads()
+
+    try:
+        links_years = await asyncio.to_thread(listar_links_http, session, url_demonstracoes)
+        max_year = extrair_anos_limpos(list(links_years))
+
+        secoes = [url_operadoras]
+        if max_year:
+            secoes.insert(0, f"{url_demonstracoes.rstrip('/')}/{max_year}")
+
+        for url_secao in secoes:
+            try:
+                await baixar_secao_http(session, url_secao, manifesto, limite)
+            except Exception as e:
+                print(f"Erro na secao {url_secao}: {e}")
+
+    finally:
+        salvar_manifesto_downloads(manifesto)
+        session.close()
+
+
 async def buscar_dados_ans():
     async with async_playwright() as p:
         browser = await p.firefox.launch(headless=True)
@@ -135,4 +363,7 @@ async def buscar_dados_ans():
             await browser.close()
             
 if __name__ == "__main__":
-    asyncio.run(buscar_dados_ans())
\ No newline at end of file
+    if MODO_DOWNLOAD == "navegador":
+        asyncio.run(buscar_dados_ans())
+    else:
+        asyncio.run(buscar_dados_ans_http())
\ No newline at end of file
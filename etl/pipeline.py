@@ -0,0 +1,137 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+import os
+
+from extraction import (
+    URL_DEMONSTRACOES, URL_OPERADORAS, MAX_DOWNLOADS_SIMULTANEOS,
+    criar_sessao_http, listar_links_http, extrair_anos_limpos, baixar_secao_http,
+    carregar_manifesto_downloads, salvar_manifesto_downloads,
+)
+from transformation import (
+    carregar_cadastro_validado, listar_membros_trimestre,
+    nome_arquivo_trimestre, acumular_totais, exportar_consolidado,
+    inicializar_worker_cadastro, totalizar_arquivo_worker,
+)
+
+
+# Quantos downloads prontos podem esperar processamento antes de segurar os proximos
+TAMANHO_FILA = int(os.getenv("TAMANHO_FILA", "8"))
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", str(os.cpu_count() or 1)))
+
+
+def arquivos_do_download(file_path: str, year: int) -> List[str]:
+    """Responsavel por converter um download pronto nos arquivos trimestrais do ano que ele contem"""
+    if file_path.lower().endswith(".zip"):
+        return listar_membros_trimestre(file_path, year)
+    if os.path.basename(file_path).endswith(f"{year}.csv"):
+        return [file_path]
+    return []
+
+
+async def consumir_downloads(fila: asyncio.Queue, year: int, executor: ProcessPoolExecutor, estado: dict, chunksize: Optional[int] = None):
+    """Funcao responsavel por validar e totalizar cada download assim que ele sai da fila"""
+    loop = asyncio.get_running_loop()
+
+    while True:
+        file_path = await fila.get()
+        try:
+            if file_path is None:
+                return
+
+            for url_complete in arquivos_do_download(file_path, year):
+                file_name = nome_arquivo_trimestre(url_complete)
+                if file_name in estado["processados"]:
+                    continue
+                estado["processados"].add(file_name)
+
+                df_arquivo = await loop.run_in_executor(executor, totalizar_arquivo_worker, url_complete, chunksize)
+                estado["totais"] = acumular_totais(estado["totais"], df_arquivo)
+                estado["concluidos"] += 1
+                print(f"{file_name} consolidado ({estado['concluidos']} trimestre(s) prontos)")
+
+        except Exception as e:
+            print(f"Erro ao processar {file_path}: {e}")
+            estado["falhas"].append(file_path)
+        finally:
+            fila.task_done()
+
+
+async def executar_pipeline(
+    year: Optional[int] = None,
+    url_demonstracoes: str = URL_DEMONSTRACOES,
+    url_operadoras: str = URL_OPERADORAS,
+    workers: int = PIPELINE_WORKERS,
+    max_downloads: int = MAX_DOWNLOADS_SIMULTANEOS,
+    chunksize: Optional[int] = None,
+    parquet: bool = False,
+):
+    """Funcao responsavel por rodar extracao e transformacao juntas em um unico fluxo.
+
+    O cadastro de operadoras e baixado primeiro, porque a validacao depende dele. Depois
+    os downloads das demonstracoes vao para uma fila limitada e cada arquivo pronto ja e
+    validado e totalizado em um pool de processos enquanto os demais ainda estao baixando.
+    Se algum trimestre nao puder ser baixado (nem tiver copia local) ou processado, nada e
+    exportado, para nao sobrescrever o consolidado anterior com um ano parcial.
+    """
+    session = criar_sessao_http(max_downloads)
+    limite = asyncio.Semaphore(max_downloads)
+    manifesto = carregar_manifesto_downloads()
+
+    try:
+        await baixar_secao_http(session, url_operadoras, manifesto, limite)
+
+        df_cadastro = carregar_cadastro_validado()
+        if df_cadastro.empty:
+            print("Cadastro de operadoras vazio, abortando.")
+            return "Sem dados"
+
+        if year is None:
+            links_years = await asyncio.to_thread(listar_links_http, session, url_demonstracoes)
+            year = extrair_anos_limpos(list(links_years))
+            if not year:
+                return "Sem dados"
+
+        fila = asyncio.Queue(maxsize=TAMANHO_FILA)
+        estado = {"totais": None, "processados": set(), "concluidos": 0, "falhas": []}
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=inicializar_worker_cadastro,
+            initargs=(df_cadastro,)
+        ) as executor:
+            consumidores = [
+                asyncio.create_task(consumir_downloads(fila, int(year), executor, estado, chunksize))
+                for _ in range(workers)
+            ]
+
+            try:
+                estado["falhas"] += await baixar_secao_http(
+                    session, f"{url_demonstracoes.rstrip('/')}/{year}", manifesto, limite, fila
+                )
+            except Exception as e:
+                print(f"Erro na secao de demonstracoes {year}: {e}")
+                estado["falhas"].append(f"secao {year}")
+            finally:
+                for _ in consumidores:
+                    await fila.put(None)
+                await asyncio.gather(*consumidores)
+
+    finally:
+        salvar_manifesto_downloads(manifesto)
+        session.close()
+
+    # Um trimestre faltando geraria um consolidado parcial por cima do anterior
+    if estado["falhas"]:
+        print(f"Exportacao cancelada, trimestres sem download ou processamento: {', '.join(estado['falhas'])}")
+        return "Download incompleto"
+
+    if estado["totais"] is None:
+        print("Nenhum dado encontrado para consolidar.")
+        return "Sem dados"
+
+    return exportar_consolidado(estado["totais"], parquet)
+
+
+if __name__ == "__main__":
+    asyncio.run(executar_pipeline())
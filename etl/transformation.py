@@ -1,22 +1,91 @@
-from typing import List
+import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
+from typing import List, Optional
+import hashlib
+import json
 import os
+import zipfile
 from validate_docbr import CNPJ
-from extraction import compactar_arquivo_zip
+from extraction import compactar_dataframe_zip
 
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 FILE_CSV_FOLDER = os.path.join(BASE_DIR, "data", "csv")
-FILE_ZIP_ARCHIVE = os.path.join(BASE_DIR, "data", "zip", "consolidado_despesas.zip")
+FILE_ZIP_FOLDER = os.path.join(BASE_DIR, "data", "zip")
+FILE_ZIP_ARCHIVE = os.path.join(FILE_ZIP_FOLDER, "consolidado_despesas.zip")
 FILE_OPERADORAS = os.path.join(FILE_CSV_FOLDER, "Relatorio_cadop.csv")
 FILE_METRICAS = os.path.join(FILE_CSV_FOLDER, "despesas_agregadas.csv")
 
 FILE_OPERADORAS_ATIVAS = os.path.join(FILE_CSV_FOLDER, "operadoras_ativas.csv")
 FILE_INACTIVE_OPERADORAS = os.path.join(FILE_CSV_FOLDER, "operadoras_inativas.csv")
 
+FOLDER_INCREMENTAL = os.path.join(BASE_DIR, "data", "incremental")
+FOLDER_PARQUET = os.path.join(BASE_DIR, "data", "parquet")
+FOLDER_CACHE = os.path.join(BASE_DIR, "data", "cache")
+
+COLUNAS_CONSOLIDADO = [
+    "CNPJ", "RAZAOSOCIAL", "TRIMESTRE", "ANO", 
+    "VALOR DESPESA", "REGISTRO ANS", "MODALIDADEE", "UF"
+]
+COLUNAS_AGRUPAMENTO = [
+    "CNPJ", "RAZAOSOCIAL", "TRIMESTRE", "ANO", 
+    "REGISTRO ANS", "MODALIDADEE", "UF"
+]
+DTYPES_TOTALIZADO = {
+    "CNPJ": str, "RAZAOSOCIAL": str, "TRIMESTRE": "int64", "ANO": "int64",
+    "REGISTRO ANS": str, "MODALIDADEE": str, "UF": str, "VALOR DESPESA": float,
+}
+COLUNAS_CADASTRO = {
+    "Razao_Social": "RAZAOSOCIAL",
+    "Modalidade": "MODALIDADEE",
+    "UF": "UF",
+}
+
+COLUNAS_DEMONSTRACOES = ["DATA", "REG_ANS", "DESCRICAO", "VL_SALDO_FINAL"]
+DESCRICAO_DESPESAS = "Despesas com Eventos / Sinistros"
+CHUNKSIZE_PADRAO = 200_000
+
+# Arquivos trimestrais dentro de um zip sao referenciados como "<caminho do zip>::<membro>"
+SEPARADOR_ZIP = "::"
+
+# Mesmos nomes de coluna das tabelas em server/database/schema.sql
+RENOMEAR_COLUNAS_BANCO = {
+    'registro_operadora': 'registro_ans',
+    'razaosocial': 'razao_social',
+    'modalidadee': 'modalidade',
+}
+DTYPES_BANCO = {
+    'trimestre': 'int16',
+    'ano': 'int16',
+    'valor_despesa': 'float64',
+    'total_geral': 'float64',
+    'media_trimestral': 'float64',
+    'desvio_padrao_despesas': 'float64',
+}
+
+# Pesos do modulo 11 usados nos digitos verificadores do CNPJ
+PESOS_CNPJ_PRIMEIRO = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+PESOS_CNPJ_SEGUNDO = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+
+
+def encontrar_coluna_registro(columns) -> str:
+    """Funcao responsavel por descobrir qual coluna do cadastro guarda o Registro ANS."""
+    reg_col = "REGISTRO_OPERADORA"
+    if reg_col not in columns:
+        
+        possible_cols = [c for c in columns if "REGISTRO" in c.upper() and "ANS" in c.upper()]
+        if possible_cols:
+            reg_col = possible_cols[0]
+        else:
+            reg_col = 'Registro_ANS'
+    return reg_col
+
 
 def carregar_cadastro_operadoras() -> pd.DataFrame:
     """Funcao responsavel por ler o cadastro de operadoras e prepara o indice para busca."""
@@ -26,14 +95,7 @@ def carregar_cadastro_operadoras() -> pd.DataFrame:
         
         df_cadop.columns = df_cadop.columns.str.strip()
         
-        reg_col = "REGISTRO_OPERADORA"
-        if reg_col not in df_cadop.columns:
-            
-            possible_cols = [c for c in df_cadop.columns if "REGISTRO" in c.upper() and "ANS" in c.upper()]
-            if possible_cols:
-                reg_col = possible_cols[0]
-            else:
-                reg_col = 'Registro_ANS'
+        reg_col = encontrar_coluna_registro(df_cadop.columns)
 
         if reg_col in df_cadop.columns:
              df_cadop[reg_col] = df_cadop[reg_col].str.strip().str.replace(r'\D', '', regex=True).str.zfill(6)
@@ -49,110 +111,568 @@ def carregar_cadastro_operadoras() -> pd.DataFrame:
         return pd.DataFrame()
 
 
-def processar_linha_despesa(line: list, df_cadop: pd.DataFrame, validator: CNPJ) -> List:
-    """Funcao responsavel por validade inconsistencias, CNPJ e duplicidade de uma linha."""
-    valor_despesas = float(str(line[5]).replace(',', '.'))
-        
-    reg_ans = str(line[1]).strip().zfill(6)
+def validar_cnpj_vetorizado(cnpjs: pd.Series) -> np.ndarray:
+    """Funcao responsavel por validar os digitos verificadores de uma coluna inteira de CNPJs com NumPy."""
+    valores = cnpjs.astype(str)
+    numericos = valores.str.fullmatch(r"[0-9]{14}").fillna(False).to_numpy(dtype=bool)
+    resultado = np.zeros(len(valores), dtype=bool)
 
-    if valor_despesas < 0:
-        return None
+    if numericos.any():
+        texto = "".join(valores[numericos].tolist()).encode("ascii")
+        digitos = np.frombuffer(texto, dtype=np.uint8).reshape(-1, 14).astype(np.int64) - 48
 
-    try:
-        if reg_ans in df_cadop.index:
-            dados_op = df_cadop.loc[reg_ans]
-            cnpj_val = str(dados_op['CNPJ']).strip().zfill(14)
+        primeiro = (digitos[:, :12] @ PESOS_CNPJ_PRIMEIRO) % 11
+        primeiro = np.where(primeiro < 2, 0, 11 - primeiro)
+        segundo = (digitos[:, :13] @ PESOS_CNPJ_SEGUNDO) % 11
+        segundo = np.where(segundo < 2, 0, 11 - segundo)
+
+        resultado[numericos] = (primeiro == digitos[:, 12]) & (segundo == digitos[:, 13])
+
+    # CNPJs fora do formato numerico (mascara, letras) seguem a regra da biblioteca
+    outros = ~numericos & valores.notna().to_numpy(dtype=bool)
+    if outros.any():
+        validator = CNPJ()
+        resultado[outros] = [validator.validate(doc) for doc in valores[outros]]
+
+    return resultado
+
+
+def construir_indice_cadastro() -> pd.DataFrame:
+    """Funcao responsavel por ler do Relatorio_cadop.csv so as colunas usadas na validacao e montar o indice compacto.
+
+    O indice fica com Registro ANS como index e as colunas CNPJ, CNPJ_VALIDO, RAZAOSOCIAL,
+    MODALIDADEE e UF, com os textos repetidos como category.
+    """
+    colunas_arquivo = pd.read_csv(FILE_OPERADORAS, sep=";", nrows=0, encoding='utf-8-sig').columns.str.strip()
+    reg_col = encontrar_coluna_registro(colunas_arquivo)
+    if reg_col not in colunas_arquivo or "CNPJ" not in colunas_arquivo:
+        print(f"Coluna de Registro ANS ou CNPJ não encontrada em {FILE_OPERADORAS}")
+        return pd.DataFrame()
+
+    usecols = [reg_col, "CNPJ"] + [c for c in COLUNAS_CADASTRO if c in colunas_arquivo]
+    df_cadop = pd.read_csv(
+        FILE_OPERADORAS, sep=";", dtype=str, encoding='utf-8-sig',
+        usecols=lambda c: c.strip() in usecols
+    )
+    df_cadop.columns = df_cadop.columns.str.strip()
+
+    df_cadop[reg_col] = df_cadop[reg_col].str.strip().str.replace(r'\D', '', regex=True).str.zfill(6)
+    df_cadop = df_cadop.drop_duplicates(subset=[reg_col]).set_index(reg_col)
+    df_cadop.index.name = "REGISTRO ANS"
+
+    df_indice = pd.DataFrame(index=df_cadop.index)
+    df_indice["CNPJ"] = df_cadop["CNPJ"].str.strip().str.zfill(14)
+    df_indice["CNPJ_VALIDO"] = validar_cnpj_vetorizado(df_indice["CNPJ"])
+
+    for coluna_origem, coluna_final in COLUNAS_CADASTRO.items():
+        if coluna_origem in df_cadop.columns:
+            df_indice[coluna_final] = df_cadop[coluna_origem].astype("category")
         else:
-            return None
-    except Exception:
-        return None
+            df_indice[coluna_final] = ""
 
-    if not validator.validate(cnpj_val):
-        return None
+    return df_indice
 
-    data_str = str(line[0])
+
+# Indice ja carregado neste processo, junto com (caminho, tamanho, mtime) do cadastro que o gerou
+_indice_cadastro = {"chave": None, "df": None}
+
+
+def carregar_indice_cadastro() -> pd.DataFrame:
+    """Funcao responsavel por devolver o indice compacto do cadastro, construindo no maximo uma vez por versao.
+
+    O indice e guardado em data/cache/cadastro_<sha256>.parquet, entao uma nova execucao com o mesmo
+    Relatorio_cadop.csv so le o parquet; dentro do processo ele fica em memoria ate o arquivo mudar.
+    """
     try:
-        parte_ano = data_str.split("-")[0]
-        parte_mes = data_str.split("-")[1]
-        ano = int(parte_ano)
-        mes = int(parte_mes)
-    except:
-        return None
+        stat = os.stat(FILE_OPERADORAS)
+        chave = (FILE_OPERADORAS, stat.st_size, stat.st_mtime)
+        if _indice_cadastro["chave"] == chave:
+            return _indice_cadastro["df"]
+
+        sha = calcular_hash_arquivo(FILE_OPERADORAS)
+        cache_path = os.path.join(FOLDER_CACHE, f"cadastro_{sha}.parquet")
+
+        if os.path.exists(cache_path):
+            df_indice = pd.read_parquet(cache_path)
+        else:
+            df_indice = construir_indice_cadastro()
+            if df_indice.empty:
+                return df_indice
+
+            os.makedirs(FOLDER_CACHE, exist_ok=True)
+            for antigo in os.listdir(FOLDER_CACHE):
+                if antigo.startswith("cadastro_") and antigo.endswith(".parquet"):
+                    os.remove(os.path.join(FOLDER_CACHE, antigo))
+            df_indice.to_parquet(cache_path)
+            print(f"Indice do cadastro gravado em {cache_path}")
+
+        _indice_cadastro["chave"] = chave
+        _indice_cadastro["df"] = df_indice
+        return df_indice
+
+    except Exception as e:
+        print(f"Erro ao carregar indice do cadastro de operadoras: {e}")
+        return pd.DataFrame()
+
+
+def carregar_cadastro_validado() -> pd.DataFrame:
+    """Funcao responsavel por devolver so as operadoras de CNPJ valido, prontas para o join com as despesas."""
+    df_indice = carregar_indice_cadastro()
+    if df_indice.empty:
+        return df_indice
+
+    return df_indice.loc[df_indice["CNPJ_VALIDO"], ["CNPJ"] + list(COLUNAS_CADASTRO.values())]
+
+
+def validar_despesas(df: pd.DataFrame, df_cadastro: pd.DataFrame) -> pd.DataFrame:
+    """Funcao responsavel por validar inconsistencias, CNPJ e datas de um bloco de despesas em operacoes de coluna."""
+    valores = df["VL_SALDO_FINAL"]
+    if not pd.api.types.is_numeric_dtype(valores):
+        valores = pd.to_numeric(valores.astype(str).str.replace(',', '.', regex=False), errors='coerce')
 
-    trimestre = (mes - 1) // 3 + 1
+    df_despesas = pd.DataFrame({
+        "VALOR DESPESA": valores.astype(float),
+        "REGISTRO ANS": df["REG_ANS"].str.strip().str.zfill(6),
+    })
+
+    partes_data = df["DATA"].astype(str).str.split("-")
+    df_despesas["ANO"] = pd.to_numeric(partes_data.str[0], errors='coerce')
+    mes = pd.to_numeric(partes_data.str[1], errors='coerce')
+    df_despesas["TRIMESTRE"] = (mes - 1) // 3 + 1
+
+    df_despesas = df_despesas[
+        ~(df_despesas["VALOR DESPESA"] < 0)
+        & df_despesas["REGISTRO ANS"].notna()
+        & df_despesas["ANO"].notna()
+        & df_despesas["TRIMESTRE"].notna()
+    ]
+
+    df_despesas = df_despesas.join(df_cadastro, on="REGISTRO ANS", how="inner")
+    df_despesas["ANO"] = df_despesas["ANO"].astype("int64")
+    df_despesas["TRIMESTRE"] = df_despesas["TRIMESTRE"].astype("int64")
+
+    return df_despesas[COLUNAS_CONSOLIDADO]
+
+
+def listar_arquivos_trimestre(year: int) -> List[str]:
+    """Funcao responsavel por listar os arquivos trimestrais do ano.
+
+    Considera os CSVs em FILE_CSV_FOLDER e os CSVs dentro dos zips baixados em FILE_ZIP_FOLDER,
+    que sao lidos direto do zip sem extrair. Se o mesmo trimestre existir nos dois, o CSV ja
+    extraido e usado.
+    """
+    arquivos = [
+        os.path.join(FILE_CSV_FOLDER, file_name)
+        for file_name in os.listdir(FILE_CSV_FOLDER)
+        if file_name.endswith(f"{year}.csv") and file_name != "consolidado_despesas.csv"
+    ]
+    nomes = {nome_arquivo_trimestre(url_complete) for url_complete in arquivos}
+
+    if not os.path.isdir(FILE_ZIP_FOLDER):
+        return arquivos
+
+    for zip_name in sorted(os.listdir(FILE_ZIP_FOLDER)):
+        zip_path = os.path.join(FILE_ZIP_FOLDER, zip_name)
+        if not zip_name.lower().endswith(".zip") or zip_path == FILE_ZIP_ARCHIVE:
+            continue
+
+        for url_complete in listar_membros_trimestre(zip_path, year):
+            if nome_arquivo_trimestre(url_complete) not in nomes:
+                arquivos.append(url_complete)
+                nomes.add(nome_arquivo_trimestre(url_complete))
+
+    return arquivos
+
+
+def listar_membros_trimestre(zip_path: str, year: int) -> List[str]:
+    """Funcao responsavel por listar os CSVs trimestrais do ano dentro de um zip, no formato zip::membro."""
+    try:
+        with zipfile.ZipFile(zip_path, "r") as zip_ref:
+            membros = zip_ref.namelist()
+    except zipfile.BadZipFile as e:
+        print(f"Arquivo {os.path.basename(zip_path)} invalido, ignorando: {e}")
+        return []
 
     return [
-        cnpj_val,
-        dados_op.get('Razao_Social', dados_op.get('Razao_Social', '')),
-        trimestre,
-        ano,
-        valor_despesas,
-        reg_ans,
-        dados_op.get('Modalidade', ''),
-        dados_op.get('UF', '')
+        f"{zip_path}{SEPARADOR_ZIP}{membro}"
+        for membro in membros
+        if os.path.basename(membro).endswith(f"{year}.csv")
     ]
 
 
+def nome_arquivo_trimestre(url_complete: str) -> str:
+    """Funcao responsavel por devolver o nome do CSV trimestral, esteja ele solto ou dentro de um zip."""
+    return os.path.basename(url_complete.split(SEPARADOR_ZIP)[-1])
+
+
+@contextmanager
+def abrir_arquivo_trimestre(url_complete: str):
+    """Funcao responsavel por abrir um arquivo trimestral em modo binario, lendo membros de zip em streaming."""
+    if SEPARADOR_ZIP not in url_complete:
+        with open(url_complete, "rb") as arquivo:
+            yield arquivo
+        return
+
+    zip_path, membro = url_complete.split(SEPARADOR_ZIP, 1)
+    with zipfile.ZipFile(zip_path, "r") as zip_ref, zip_ref.open(membro) as arquivo:
+        yield arquivo
+
+
+def filtrar_despesas_eventos(df: pd.DataFrame) -> pd.DataFrame:
+    """Funcao responsavel por manter apenas as linhas de Despesas com Eventos / Sinistros."""
+    return df[df["DESCRICAO"].str.contains(DESCRICAO_DESPESAS, case=False, na=False)]
+
+
+def totalizar_despesas(df_validado: pd.DataFrame) -> pd.DataFrame:
+    """Funcao responsavel por somar as despesas validadas por operadora e trimestre."""
+    df_validado = df_validado.assign(
+        **{"VALOR DESPESA": pd.to_numeric(df_validado["VALOR DESPESA"], errors='coerce').fillna(0)}
+    )
+    return df_validado.groupby(COLUNAS_AGRUPAMENTO, as_index=False)["VALOR DESPESA"].sum()
+
+
+def despesas_totalizadas_vazias() -> pd.DataFrame:
+    """Funcao responsavel pelo resultado vazio dos modos que ja devolvem as despesas totalizadas."""
+    return pd.DataFrame(columns=COLUNAS_AGRUPAMENTO + ["VALOR DESPESA"])
+
+
+def acumular_totais(df_acumulado: Optional[pd.DataFrame], df_parcial: pd.DataFrame) -> pd.DataFrame:
+    """Funcao responsavel por somar um total parcial ao total acumulado, mantendo uma linha por grupo."""
+    if df_acumulado is None or df_acumulado.empty:
+        return df_parcial
+    if df_parcial.empty:
+        return df_acumulado
+
+    df_unido = pd.concat([df_acumulado, df_parcial], ignore_index=True)
+    return df_unido.groupby(COLUNAS_AGRUPAMENTO, as_index=False)["VALOR DESPESA"].sum()
+
+
+def totalizar_arquivo_em_blocos(url_complete: str, df_cadastro: pd.DataFrame, chunksize: int = CHUNKSIZE_PADRAO) -> pd.DataFrame:
+    """Funcao responsavel por ler um arquivo trimestral em blocos, somando cada bloco ao total do arquivo."""
+    df_total = None
+
+    with abrir_arquivo_trimestre(url_complete) as arquivo, pd.read_csv(
+        arquivo, sep=";", decimal=",", dtype={'REG_ANS': str},
+        usecols=COLUNAS_DEMONSTRACOES, chunksize=chunksize
+    ) as leitor:
+        for df_bloco in leitor:
+            df_filter = filtrar_despesas_eventos(df_bloco)
+            if df_filter.empty:
+                continue
+
+            df_parcial = totalizar_despesas(validar_despesas(df_filter, df_cadastro))
+            df_total = acumular_totais(df_total, df_parcial)
 
-def analisando_inconsistencia(year: int) -> List:
+    if df_total is None:
+        return despesas_totalizadas_vazias()
+    return df_total
+
+
+def totalizar_arquivo(url_complete: str, df_cadastro: pd.DataFrame, chunksize: Optional[int] = None) -> pd.DataFrame:
+    """Funcao responsavel por totalizar um unico arquivo trimestral, inteiro ou em blocos."""
+    if chunksize:
+        return totalizar_arquivo_em_blocos(url_complete, df_cadastro, chunksize)
+
+    with abrir_arquivo_trimestre(url_complete) as arquivo:
+        df = pd.read_csv(arquivo, sep=";", decimal=",", dtype={'REG_ANS': str}, usecols=COLUNAS_DEMONSTRACOES)
+    return totalizar_despesas(validar_despesas(filtrar_despesas_eventos(df), df_cadastro))
+
+
+# Copia somente leitura do cadastro validado, enviada uma unica vez para cada processo do pool
+_cadastro_worker = None
+
+
+def inicializar_worker_cadastro(df_cadastro: pd.DataFrame):
+    """Funcao responsavel por guardar o cadastro validado no processo do pool, uma vez por processo."""
+    global _cadastro_worker
+    _cadastro_worker = df_cadastro
+
+
+def totalizar_arquivo_worker(url_complete: str, chunksize: Optional[int]) -> pd.DataFrame:
+    """Funcao responsavel por totalizar um arquivo trimestral no processo do pool, com o cadastro do initializer."""
+    print(f"[pid {os.getpid()}] Processando {nome_arquivo_trimestre(url_complete)}...")
+    return totalizar_arquivo(url_complete, _cadastro_worker, chunksize)
+
+
+def totalizar_arquivos(arquivos: List[str], df_cadastro: pd.DataFrame, workers: Optional[int] = None, chunksize: Optional[int] = None):
+    """Funcao responsavel por gerar (arquivo, totais do arquivo) para cada arquivo, em um pool de processos quando workers > 1."""
+    if not workers or workers <= 1 or len(arquivos) <= 1:
+        for url_complete in arquivos:
+            print(f"Processando {nome_arquivo_trimestre(url_complete)}...")
+            yield url_complete, totalizar_arquivo(url_complete, df_cadastro, chunksize)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(arquivos)),
+        initializer=inicializar_worker_cadastro,
+        initargs=(df_cadastro,)
+    ) as executor:
+        yield from zip(arquivos, executor.map(totalizar_arquivo_worker, arquivos, [chunksize] * len(arquivos)))
+
+
+def calcular_hash_arquivo(file_path: str) -> str:
+    """Funcao responsavel por calcular o sha256 de um arquivo lendo em blocos."""
+    sha = hashlib.sha256()
+    with abrir_arquivo_trimestre(file_path) as arquivo:
+        for bloco in iter(lambda: arquivo.read(1024 * 1024), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def descrever_arquivo(file_path: str, anterior: Optional[dict] = None) -> dict:
+    """Funcao responsavel por montar a entrada do manifesto (nome, tamanho, mtime e hash) de um arquivo.
+
+    O hash so e recalculado quando tamanho ou mtime mudaram em relacao a entrada anterior.
+    Para membros de zip sao usados o tamanho descompactado e a data gravados no proprio zip.
+    """
+    if SEPARADOR_ZIP in file_path:
+        zip_path, membro = file_path.split(SEPARADOR_ZIP, 1)
+        with zipfile.ZipFile(zip_path, "r") as zip_ref:
+            info = zip_ref.getinfo(membro)
+        tamanho, mtime = info.file_size, datetime(*info.date_time).timestamp()
+    else:
+        stat = os.stat(file_path)
+        tamanho, mtime = stat.st_size, stat.st_mtime
+
+    entrada = {"nome": nome_arquivo_trimestre(file_path), "tamanho": tamanho, "mtime": mtime}
+
+    if anterior and anterior.get("tamanho") == entrada["tamanho"] and anterior.get("mtime") == entrada["mtime"]:
+        entrada["sha256"] = anterior.get("sha256")
+    else:
+        entrada["sha256"] = calcular_hash_arquivo(file_path)
+    return entrada
+
+
+def carregar_manifesto(year: int) -> dict:
+    """Funcao responsavel por ler o manifesto de arquivos ja processados do ano."""
+    manifest_path = os.path.join(FOLDER_INCREMENTAL, f"manifesto_{year}.json")
+    if not os.path.exists(manifest_path):
+        return {"cadastro": None, "arquivos": {}}
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Manifesto {manifest_path} invalido, reprocessando tudo: {e}")
+        return {"cadastro": None, "arquivos": {}}
+
+
+def salvar_manifesto(year: int, manifesto: dict):
+    """Funcao responsavel por gravar o manifesto de forma atomica."""
+    os.makedirs(FOLDER_INCREMENTAL, exist_ok=True)
+    manifest_path = os.path.join(FOLDER_INCREMENTAL, f"manifesto_{year}.json")
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+
+
+def caminho_parcial(year: int, file_name: str) -> str:
+    return os.path.join(FOLDER_INCREMENTAL, str(year), f"{file_name}.parcial.csv")
+
+
+def salvar_parcial(year: int, file_name: str, df_parcial: pd.DataFrame):
+    """Funcao responsavel por guardar os totais de um arquivo trimestral para reaproveitar depois."""
+    os.makedirs(os.path.join(FOLDER_INCREMENTAL, str(year)), exist_ok=True)
+    df_parcial.to_csv(caminho_parcial(year, file_name), sep=";", index=False, encoding='utf-8-sig')
+
+
+def carregar_parcial(year: int, file_name: str) -> pd.DataFrame:
+    """Funcao responsavel por ler os totais salvos de um arquivo trimestral."""
+    return pd.read_csv(
+        caminho_parcial(year, file_name), sep=";", encoding='utf-8-sig',
+        dtype=DTYPES_TOTALIZADO, float_precision="round_trip"
+    )
+
+
+def totalizar_incremental(year: int, df_cadastro: pd.DataFrame, workers: Optional[int] = None, chunksize: Optional[int] = None) -> Optional[pd.DataFrame]:
+    """Funcao responsavel por reprocessar apenas os arquivos trimestrais novos ou alterados desde a ultima execucao.
+
+    Cada arquivo tem seus totais guardados em data/incremental/<ano>; o resultado final
+    e a soma desses parciais. Um arquivo alterado substitui o proprio parcial, um arquivo
+    removido deixa de ser somado, e uma mudanca no Relatorio_cadop.csv invalida todos.
+    """
+    manifesto = carregar_manifesto(year)
+    cadastro_atual = descrever_arquivo(FILE_OPERADORAS, manifesto.get("cadastro"))
+    cadastro_anterior = manifesto.get("cadastro") or {}
+    if cadastro_atual["sha256"] != cadastro_anterior.get("sha256"):
+        if manifesto["arquivos"]:
+            print("Cadastro de operadoras alterado, todos os trimestres serao reprocessados.")
+        manifesto["arquivos"] = {}
+
+    arquivos = listar_arquivos_trimestre(year)
+    entradas = {}
+    pendentes = []
+    for url_complete in arquivos:
+        file_name = nome_arquivo_trimestre(url_complete)
+        anterior = manifesto["arquivos"].get(file_name)
+        entrada = descrever_arquivo(url_complete, anterior)
+        entradas[file_name] = entrada
+
+        if (
+            not anterior
+            or anterior.get("sha256") != entrada["sha256"]
+            or not os.path.exists(caminho_parcial(year, file_name))
+        ):
+            pendentes.append(url_complete)
+
+    print(f"Incremental: {len(pendentes)} de {len(arquivos)} arquivo(s) para processar.")
+
+    for url_complete, df_arquivo in totalizar_arquivos(pendentes, df_cadastro, workers, chunksize):
+        salvar_parcial(year, nome_arquivo_trimestre(url_complete), df_arquivo)
+
+    for file_name in set(manifesto["arquivos"]) - set(entradas):
+        print(f"Arquivo {file_name} nao existe mais, removendo seus totais.")
+        if os.path.exists(caminho_parcial(year, file_name)):
+            os.remove(caminho_parcial(year, file_name))
+
+    df_totalizado = None
+    for file_name in entradas:
+        df_totalizado = acumular_totais(df_totalizado, carregar_parcial(year, file_name))
+
+    salvar_manifesto(year, {"cadastro": cadastro_atual, "arquivos": entradas})
+    return df_totalizado
+
+
+def analisando_inconsistencia_totalizada(year: int, workers: Optional[int] = None, chunksize: Optional[int] = None, incremental: bool = False) -> pd.DataFrame:
+    """Funcao responsavel por devolver as despesas do ano ja totalizadas por operadora e trimestre.
+
+    Cada arquivo e somado ao acumulado assim que termina, sem guardar linhas brutas: com
+    chunksize ele e lido em blocos (pico de memoria pelo chunksize e numero de grupos), com
+    workers > 1 os arquivos vao para um pool de processos, e com incremental=True so os
+    arquivos novos ou alterados sao lidos.
+    """
+    df_cadastro = carregar_cadastro_validado()
+
+    if df_cadastro.empty:
+        print("Cadastro de operadoras vazio, abortando.")
+        return despesas_totalizadas_vazias()
+
+    try:
+        if incremental:
+            df_totalizado = totalizar_incremental(year, df_cadastro, workers, chunksize)
+        else:
+            df_totalizado = None
+            for _, df_arquivo in totalizar_arquivos(listar_arquivos_trimestre(year), df_cadastro, workers, chunksize):
+                df_totalizado = acumular_totais(df_totalizado, df_arquivo)
+
+    except Exception as e:
+        print(f"Erro no processamento de arquivos: {e}")
+        return despesas_totalizadas_vazias()
+
+    if df_totalizado is None:
+        return despesas_totalizadas_vazias()
+    return df_totalizado
+
+
+def analisando_inconsistencia(year: int) -> pd.DataFrame:
     """Percorre os arquivos, extrai dados brutos e chama a validação."""
-    validator = CNPJ()
-    df_cadop = carregar_cadastro_operadoras()
+    df_cadastro = carregar_cadastro_validado()
     
-    if df_cadop.empty:
+    if df_cadastro.empty:
         print("Cadastro de operadoras vazio, abortando.")
-        return []
+        return pd.DataFrame(columns=COLUNAS_CONSOLIDADO)
 
     data_validate = []
 
     try:
-        for file_name in os.listdir(FILE_CSV_FOLDER):
-            if file_name.endswith(f"{year}.csv") and file_name != "consolidado_despesas.csv":
-                url_complete = os.path.join(FILE_CSV_FOLDER, file_name)
-                print(f"Processando {file_name}...")
+        for url_complete in listar_arquivos_trimestre(year):
+            print(f"Processando {nome_arquivo_trimestre(url_complete)}...")
 
-                df = pd.read_csv(url_complete, sep=";", decimal=",", dtype={'REG_ANS': str})
-                
-                df_filter = df[df["DESCRICAO"].str.contains("Despesas com Eventos / Sinistros", case=False, na=False)]
-                
-                raw_data = df_filter.values.tolist()
+            with abrir_arquivo_trimestre(url_complete) as arquivo:
+                df = pd.read_csv(arquivo, sep=";", decimal=",", dtype={'REG_ANS': str})
+            
+            df_filter = filtrar_despesas_eventos(df)
 
-                for line in raw_data:
-                    resultado = processar_linha_despesa(line, df_cadop, validator)
-                    if resultado:
-                        data_validate.append(resultado)
+            data_validate.append(validar_despesas(df_filter, df_cadastro))
 
-        return data_validate
+        if not data_validate:
+            return pd.DataFrame(columns=COLUNAS_CONSOLIDADO)
+
+        return pd.concat(data_validate, ignore_index=True)
 
     except Exception as e:
         print(f"Erro no processamento de arquivos: {e}")
-        return []
+        return pd.DataFrame(columns=COLUNAS_CONSOLIDADO)
 
 
-def consolidando_dados(year):
-    """Funcao responsavel por consolidadar despesas"""
-    data_validate = analisando_inconsistencia(year)
-    
-    if not data_validate:
-        print("Nenhum dado encontrado para consolidar.")
-        return "Sem dados"
+def para_colunas_banco(df: pd.DataFrame) -> pd.DataFrame:
+    """Funcao responsavel por converter um resultado do ETL para os nomes e tipos das tabelas do banco."""
+    df = df.copy()
+    df.columns = df.columns.str.lower().str.strip().str.replace(' ', '_', regex=False)
+    df = df.rename(columns=RENOMEAR_COLUNAS_BANCO)
 
-    columns_final = [
-        "CNPJ", "RAZAOSOCIAL", "TRIMESTRE", "ANO", 
-        "VALOR DESPESA", "REGISTRO ANS", "MODALIDADEE", "UF"
-    ]
+    if 'id' in df.columns:
+        df = df.drop(columns=['id'])
+
+    if 'cnpj' in df.columns:
+        df['cnpj'] = df['cnpj'].str.replace(r'\D', '', regex=True).str.zfill(14)
+
+    if 'registro_ans' in df.columns:
+        df['registro_ans'] = df['registro_ans'].str.replace(r'\D', '', regex=True).str.zfill(6)
+
+    if 'data_registro_ans' in df.columns:
+        df['data_registro_ans'] = pd.to_datetime(df['data_registro_ans'], errors='coerce').dt.date
+
+    for col, dtype in DTYPES_BANCO.items():
+        if col in df.columns:
+            df[col] = df[col].astype(dtype)
+
+    return df
+
+
+def salvar_parquet(df: pd.DataFrame, file_name: str):
+    """Funcao responsavel por gravar um resultado tipado em parquet para a carga no banco."""
+    os.makedirs(FOLDER_PARQUET, exist_ok=True)
+    file_path = os.path.join(FOLDER_PARQUET, file_name)
+    para_colunas_banco(df).to_parquet(file_path, index=False, compression="zstd")
+    print(f"Arquivo parquet criado com sucesso: {file_path}")
 
-    df_final = pd.DataFrame(data_validate, columns=columns_final)         
-    columns_agrupamento = [
-        "CNPJ", "RAZAOSOCIAL", "TRIMESTRE", "ANO", 
-        "REGISTRO ANS", "MODALIDADEE", "UF"
-    ]
 
-    df_final["VALOR DESPESA"] = pd.to_numeric(df_final["VALOR DESPESA"], errors='coerce').fillna(0)
-    df_totalizado = df_final.groupby(columns_agrupamento, as_index=False)["VALOR DESPESA"].sum()
+def remover_parquet(file_name: str):
+    """Funcao responsavel por apagar um parquet de uma execucao anterior, para a carga nao usar dados antigos."""
+    file_path = os.path.join(FOLDER_PARQUET, file_name)
+    if os.path.exists(file_path):
+        os.remove(file_path)
+        print(f"Parquet antigo removido: {file_path}")
+
+
+def gravar_parquet(df: pd.DataFrame, file_name: str, parquet: bool):
+    """Funcao responsavel por gravar o parquet da saida ou, sem parquet=True, remover o que sobrou de outra execucao."""
+    if parquet:
+        salvar_parquet(df, file_name)
+    else:
+        remover_parquet(file_name)
+
+
+def consolidando_dados(year, chunksize: Optional[int] = None, workers: Optional[int] = None, incremental: bool = False, parquet: bool = False):
+    """Funcao responsavel por consolidadar despesas
+
+    Com chunksize informado os arquivos trimestrais sao lidos em blocos e somados
+    incrementalmente (modo streaming), mantendo o pico de memoria constante.
+    Com workers informado cada arquivo trimestral e processado em um processo separado.
+    Com incremental=True apenas arquivos novos ou alterados desde a ultima execucao sao lidos.
+    Com parquet=True as saidas tambem sao gravadas tipadas em data/parquet para a carga
+    no banco; o zip e os CSVs continuam sendo gerados como exportacao. Sem parquet=True os
+    parquets de execucoes anteriores sao apagados, para a carga nao ler dados antigos.
+    """
+    if incremental or workers or chunksize:
+        df_totalizado = analisando_inconsistencia_totalizada(year, workers, chunksize, incremental)
+    else:
+        df_totalizado = totalizar_despesas(analisando_inconsistencia(year))
+
+    return exportar_consolidado(df_totalizado, parquet)
+
+
+def exportar_consolidado(df_totalizado: pd.DataFrame, parquet: bool = False):
+    """Funcao responsavel por gravar o consolidado, a divisao de operadoras ativas/inativas e as metricas."""
+    if df_totalizado.empty:
+        print("Nenhum dado encontrado para consolidar.")
+        return "Sem dados"
     
-    file_output = os.path.join(FILE_CSV_FOLDER, "consolidado_despesas.csv")
-    df_totalizado.to_csv(file_output, sep=";", index=False, encoding='utf-8-sig')
+    compactar_dataframe_zip(df_totalizado, "consolidado_despesas.csv", FILE_ZIP_ARCHIVE)
+
+    gravar_parquet(df_totalizado, "consolidado_despesas.parquet", parquet)
     
     active_regs = df_totalizado["REGISTRO ANS"].unique()
 
@@ -170,18 +690,16 @@ def consolidando_dados(year):
         df_cadop_inactive.reset_index(inplace=True)
         df_cadop_inactive.to_csv(FILE_INACTIVE_OPERADORAS, sep=";", index=False, encoding='utf-8-sig')
 
-    processar_metricas(df_totalizado)
-    
-    compactar_arquivo_zip(file_output, FILE_ZIP_ARCHIVE)
-    
-    if os.path.exists(file_output):
-        os.remove(file_output)
-        print(f"Arquivo temporario removido: {file_output}")
+        gravar_parquet(df_cadop_active, "operadoras_ativas.parquet", parquet)
+        gravar_parquet(df_cadop_inactive, "operadoras_inativas.parquet", parquet)
+
+    processar_metricas(df_totalizado, parquet)
     
     print(f"Consolidação concluída. {len(df_totalizado)} registros gerados.")
     return "Tabela processsado com sucesso"
 
-def processar_metricas(df_totalizado):
+
+def processar_metricas(df_totalizado, parquet: bool = False):
     """Funcao responsavel por gerar as metricas e consolidar em despesas_agregadas.csv"""
 
     df_metricas = df_totalizado.groupby(["RAZAOSOCIAL", "UF"]).agg(
@@ -192,6 +710,8 @@ def processar_metricas(df_totalizado):
 
     df_metricas["Desvio_Padrao_Despesas"] = df_metricas["Desvio_Padrao_Despesas"].fillna(0)
     df_metricas.to_csv(FILE_METRICAS, sep=";", index=False, encoding='utf-8-sig')
+
+    gravar_parquet(df_metricas, "despesas_agregadas.parquet", parquet)
     
 
 if __name__ == "__main__":
@@ -8,13 +8,29 @@ const api = axios.create({
   }
 })
 
-export const getOperadoras = async (page = 1, limit = 10, search = '') => {
-  let url = `/operadoras?page=${page}&limit=${limit}`;
+export interface PaginaOperadoras<T = any> {
+  itens: T[];
+  total: number;
+  proximo: string | null;
+  anterior: string | null;
+}
+
+export const getOperadoras = async (page = 1, limit = 10, search = '', cursor = ''): Promise<PaginaOperadoras> => {
+  // A tabela so mostra esses campos; o detalhe vem de /operadoras/{cnpj}/despesas
+  const params: Record<string, string | number> = { page, limit, fields: 'cnpj,razao_social,registro_ans,status' };
   if (search) {
-    url += `&search=${search}`;
+    params.search = search;
+  }
+  if (cursor) {
+    params.cursor = cursor;
+  }
+  const response = await api.get('/operadoras', { params })
+  return {
+    itens: response.data,
+    total: Number(response.headers['x-total-count'] ?? 0),
+    proximo: response.headers['x-next-cursor'] ?? null,
+    anterior: response.headers['x-prev-cursor'] ?? null,
   }
-  const response = await api.get(url)
-  return response.data
 }
 
 export const getEstatisticas = async () => {
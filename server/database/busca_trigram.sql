@@ -0,0 +1,5 @@
+-- Executado depois do pos_carga.sql apenas quando o pg_trgm pode ser instalado (schema extensoes)
+-- Indexa o LIKE '%termo%' da busca de operadoras
+
+CREATE INDEX IF NOT EXISTS idx_operadoras_razao_social_busca_trgm
+	ON operadoras USING gin (razao_social_busca extensoes.gin_trgm_ops);
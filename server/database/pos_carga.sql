@@ -0,0 +1,80 @@
+-- Executado depois da carga, no schema que esta sendo preparado, antes da troca com o public
+
+CREATE INDEX IF NOT EXISTS idx_operadoras_cnpj ON operadoras (cnpj);
+-- Busca por prefixo de CNPJ (LIKE '123%') independente da collation do banco
+CREATE INDEX IF NOT EXISTS idx_operadoras_cnpj_prefixo ON operadoras (cnpj bpchar_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_operadoras_registro_ans ON operadoras (registro_ans);
+CREATE INDEX IF NOT EXISTS idx_operadoras_razao_social_id ON operadoras (razao_social, id);
+
+CREATE INDEX IF NOT EXISTS idx_despesas_consolidadas_cnpj ON despesas_consolidadas (cnpj);
+CREATE INDEX IF NOT EXISTS idx_despesas_consolidadas_registro_ans ON despesas_consolidadas (registro_ans);
+CREATE INDEX IF NOT EXISTS idx_despesas_consolidadas_periodo ON despesas_consolidadas (ano, trimestre);
+
+-- Cubo trimestral numa unica leitura: um GROUPING SET por dimensao e () para o total geral do trimestre
+INSERT INTO cubo_despesas (dimensao, valor, ano, trimestre, quantidade, total_despesas, soma_quadrados)
+SELECT
+	CASE GROUPING(registro_ans, uf, modalidade)
+		WHEN 3 THEN 'operadora'
+		WHEN 5 THEN 'uf'
+		WHEN 6 THEN 'modalidade'
+		ELSE 'total'
+	END,
+	CASE GROUPING(registro_ans, uf, modalidade)
+		WHEN 3 THEN CAST(registro_ans AS TEXT)
+		WHEN 5 THEN CAST(uf AS TEXT)
+		WHEN 6 THEN modalidade
+	END,
+	ano, trimestre,
+	COUNT(*),
+	SUM(valor_despesa),
+	SUM(valor_despesa * valor_despesa)
+FROM despesas_consolidadas
+GROUP BY ano, trimestre, GROUPING SETS ((registro_ans), (uf), (modalidade), ());
+
+CREATE INDEX IF NOT EXISTS idx_cubo_despesas ON cubo_despesas (dimensao, valor, ano, trimestre);
+
+-- Total, media e top 5 de cada combinacao de ano/trimestre/uf (CUBE), lidos prontos pelo /estatisticas
+INSERT INTO estatisticas_despesas (ano, trimestre, uf, total_despesas, media_despesas, quantidade, top_5_operadoras)
+WITH totais AS (
+	SELECT ano, trimestre, uf,
+		SUM(valor_despesa) AS total_despesas,
+		AVG(valor_despesa) AS media_despesas,
+		COUNT(*) AS quantidade
+	FROM despesas_consolidadas
+	GROUP BY CUBE (ano, trimestre, uf)
+),
+por_operadora AS (
+	SELECT ano, trimestre, uf, registro_ans, razao_social, SUM(valor_despesa) AS total_despesa
+	FROM despesas_consolidadas
+	GROUP BY CUBE (ano, trimestre, uf), registro_ans, razao_social
+),
+ranking AS (
+	SELECT *, ROW_NUMBER() OVER (PARTITION BY ano, trimestre, uf ORDER BY total_despesa DESC, registro_ans) AS posicao
+	FROM por_operadora
+),
+top_5 AS (
+	SELECT ano, trimestre, uf,
+		jsonb_agg(
+			jsonb_build_object('registro_ans', registro_ans, 'razao_social', razao_social, 'total_despesa', total_despesa)
+			ORDER BY posicao
+		) AS top_5_operadoras
+	FROM ranking
+	WHERE posicao <= 5
+	GROUP BY ano, trimestre, uf
+)
+SELECT t.ano, t.trimestre, t.uf, t.total_despesas, t.media_despesas, t.quantidade,
+	COALESCE(p.top_5_operadoras, CAST('[]' AS JSONB))
+FROM totais t
+LEFT JOIN top_5 p
+	ON p.ano IS NOT DISTINCT FROM t.ano
+	AND p.trimestre IS NOT DISTINCT FROM t.trimestre
+	AND p.uf IS NOT DISTINCT FROM t.uf;
+
+-- Carimbo desta carga: muda a cada recarga e invalida os caches da API
+INSERT INTO versao_dados (geracao) VALUES (CAST(extract(epoch FROM clock_timestamp()) * 1000 AS BIGINT));
+
+ANALYZE operadoras;
+ANALYZE despesas_consolidadas;
+ANALYZE dados_agregados;
+ANALYZE estatisticas_despesas;
+ANALYZE cubo_despesas;
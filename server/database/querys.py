@@ -1,83 +1,243 @@
 import pandas as pd
-from .db import engine
+from sqlalchemy import text
+from .db import engine, ler_parquet
+
+ARQUIVOS_PARQUET = {
+    "despesas_consolidadas": "consolidado_despesas.parquet",
+    "operadoras": "operadoras_ativas.parquet",
+}
+
+# As analises rodam no Postgres e so o resultado sai do banco; os CASTs deixam os filtros opcionais (NULL = todos)
+CONSULTA_CRESCIMENTO_OPERADORAS = text("""
+    WITH por_trimestre AS (
+        SELECT registro_ans, ano, trimestre, SUM(valor_despesa) AS valor
+        FROM despesas_consolidadas
+        WHERE CAST(:uf AS TEXT) IS NULL OR uf = CAST(:uf AS TEXT)
+        GROUP BY registro_ans, ano, trimestre
+    ),
+    extremos AS (
+        SELECT DISTINCT
+            registro_ans,
+            FIRST_VALUE(valor) OVER janela AS primeiro,
+            LAST_VALUE(valor) OVER janela AS ultimo
+        FROM por_trimestre
+        WINDOW janela AS (
+            PARTITION BY registro_ans ORDER BY ano, trimestre
+            ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+        )
+    )
+    SELECT
+        o.razao_social,
+        e.registro_ans,
+        CAST((e.ultimo - e.primeiro) / e.primeiro * 100 AS DOUBLE PRECISION) AS crescimento_percentual
+    FROM extremos e
+    JOIN operadoras o ON o.registro_ans = e.registro_ans
+    WHERE e.primeiro <> 0
+    ORDER BY crescimento_percentual DESC, e.registro_ans
+    LIMIT :limite
+""")
+
+# Distribuicao por UF e acima da media leem o cubo trimestral da carga (cubo_despesas) em vez das linhas:
+# o custo depende da quantidade de trimestres e nao do tamanho de despesas_consolidadas
+CONSULTA_DESPESAS_POR_UF = text("""
+    SELECT
+        valor AS uf,
+        CAST(SUM(total_despesas) AS DOUBLE PRECISION) AS total_despesas,
+        CAST(SUM(total_despesas) / SUM(quantidade) AS DOUBLE PRECISION) AS media_por_operadora
+    FROM cubo_despesas
+    WHERE dimensao = 'uf'
+      AND (CAST(:ano AS INTEGER) IS NULL OR ano = CAST(:ano AS INTEGER))
+      AND (CAST(:trimestre AS INTEGER) IS NULL OR trimestre = CAST(:trimestre AS INTEGER))
+    GROUP BY valor
+    ORDER BY total_despesas DESC
+    LIMIT :limite
+""")
+
+# Media de cada operadora por trimestre (ano + trimestre) comparada com a media geral das linhas,
+# calculada na mesma passada com SUM(...) OVER ()
+CONSULTA_ACIMA_MEDIA_GERAL = text("""
+    WITH por_trimestre AS (
+        SELECT
+            valor AS registro_ans,
+            total_despesas / quantidade AS valor,
+            SUM(total_despesas) OVER () / SUM(quantidade) OVER () AS media_geral
+        FROM cubo_despesas
+        WHERE dimensao = 'operadora'
+          AND (CAST(:ano AS INTEGER) IS NULL OR ano = CAST(:ano AS INTEGER))
+    )
+    SELECT
+        o.razao_social,
+        p.registro_ans,
+        COUNT(*) AS quantidade_trimestres
+    FROM por_trimestre p
+    LEFT JOIN operadoras o ON o.registro_ans = p.registro_ans
+    WHERE p.valor > p.media_geral
+    GROUP BY p.registro_ans, o.razao_social
+    HAVING COUNT(*) >= :minimo_trimestres
+    ORDER BY quantidade_trimestres DESC, p.registro_ans
+""")
+
+
+# Mesmas analises direto nas linhas, para bancos sem o cubo (montados com iniciar_infraestrutura + migrar_sql,
+# sem o pos_carga.sql do recarregar_dados)
+CONSULTA_DESPESAS_POR_UF_LINHAS = text("""
+    SELECT
+        uf,
+        CAST(SUM(valor_despesa) AS DOUBLE PRECISION) AS total_despesas,
+        CAST(AVG(valor_despesa) AS DOUBLE PRECISION) AS media_por_operadora
+    FROM despesas_consolidadas
+    WHERE (CAST(:ano AS INTEGER) IS NULL OR ano = CAST(:ano AS INTEGER))
+      AND (CAST(:trimestre AS INTEGER) IS NULL OR trimestre = CAST(:trimestre AS INTEGER))
+    GROUP BY uf
+    ORDER BY total_despesas DESC
+    LIMIT :limite
+""")
+
+CONSULTA_ACIMA_MEDIA_GERAL_LINHAS = text("""
+    WITH por_trimestre AS (
+        SELECT
+            registro_ans,
+            AVG(valor_despesa) AS valor,
+            SUM(SUM(valor_despesa)) OVER () / SUM(COUNT(valor_despesa)) OVER () AS media_geral
+        FROM despesas_consolidadas
+        WHERE CAST(:ano AS INTEGER) IS NULL OR ano = CAST(:ano AS INTEGER)
+        GROUP BY registro_ans, ano, trimestre
+    )
+    SELECT
+        o.razao_social,
+        p.registro_ans,
+        COUNT(*) AS quantidade_trimestres
+    FROM por_trimestre p
+    LEFT JOIN operadoras o ON o.registro_ans = p.registro_ans
+    WHERE p.valor > p.media_geral
+    GROUP BY p.registro_ans, o.razao_social
+    HAVING COUNT(*) >= :minimo_trimestres
+    ORDER BY quantidade_trimestres DESC, p.registro_ans
+""")
+
+
+CONSULTA_CUBO_PREENCHIDO = text("SELECT EXISTS (SELECT 1 FROM cubo_despesas)")
+
+
+def ler_tabela(table_name, fonte="banco"):
+    """Funcao responsavel por ler uma tabela do banco ou direto do parquet tipado gerado pelo ETL"""
+    if fonte == "parquet":
+        return ler_parquet(ARQUIVOS_PARQUET[table_name])
+    return pd.read_sql(table_name, con=engine)
 
-def maior_crescimento_operadoras():
+
+def cubo_preenchido():
+    """Funcao responsavel por verificar se a carga gerou o cubo trimestral (senao as analises leem as linhas)"""
+    try:
+        with engine.connect() as connection:
+            return bool(connection.scalar(CONSULTA_CUBO_PREENCHIDO))
+    except Exception:
+        return False
+
+
+def executar_analise(consulta, **parametros):
+    """Funcao responsavel por rodar uma analise no banco trazendo so as linhas do resultado"""
+    return pd.read_sql(consulta, con=engine, params=parametros)
+
+
+def maior_crescimento_operadoras(fonte="banco", limite=5, uf=None):
     """Funcao responsavel por verificar as 5 operadoras com os maior crescimento levando em conta o tamanho da operadora"""
-    df = pd.read_sql("despesas_consolidadas", con=engine)
-    df_ops = pd.read_sql("operadoras", con=engine)
-        
-    df[['ano', 'trimestre', 'valor_despesa']] = df[['ano', 'trimestre', 'valor_despesa']].apply(pd.to_numeric)
-        
-    df.sort_values(['registro_ans', "ano", "trimestre"])
-
-    primeiro = df.groupby('registro_ans')['valor_despesa'].first()
-    ultimo = df.groupby('registro_ans')['valor_despesa'].last()
-
-    # Calculo para variacao percentual
-    crescimento = ((ultimo - primeiro) / primeiro) * 100
-    top_5 = crescimento.sort_values(ascending=False).head(5)
-
-    df_crescimento = crescimento.reset_index()
-    df_crescimento.columns = ['registro_ans', 'crescimento_percentual']
-
-    resultado_final = pd.merge(
-        df_crescimento, 
-        df_ops[['registro_ans', 'razao_social']], 
-        on='registro_ans', 
-        how='left'
-    )
-        
-    top_5 = resultado_final.replace([float('inf'), float('-inf')], 0).dropna()
-    top_5 = top_5.sort_values(by='crescimento_percentual', ascending=False).head(5)
+    if fonte == "banco":
+        top_5 = executar_analise(CONSULTA_CRESCIMENTO_OPERADORAS, limite=limite, uf=uf)
+    else:
+        df = ler_tabela("despesas_consolidadas", fonte)
+        df_ops = ler_tabela("operadoras", fonte)
+
+        df[['ano', 'trimestre', 'valor_despesa']] = df[['ano', 'trimestre', 'valor_despesa']].apply(pd.to_numeric)
+        if uf:
+            df = df[df['uf'] == uf]
+
+        df = df.groupby(['registro_ans', 'ano', 'trimestre'], as_index=False)['valor_despesa'].sum()
+        df = df.sort_values(['registro_ans', "ano", "trimestre"])
+
+        primeiro = df.groupby('registro_ans')['valor_despesa'].first()
+        ultimo = df.groupby('registro_ans')['valor_despesa'].last()
+
+        # Calculo para variacao percentual
+        crescimento = ((ultimo - primeiro) / primeiro[primeiro != 0]) * 100
+
+        df_crescimento = crescimento.dropna().reset_index()
+        df_crescimento.columns = ['registro_ans', 'crescimento_percentual']
+
+        resultado_final = pd.merge(
+            df_crescimento,
+            df_ops[['registro_ans', 'razao_social']],
+            on='registro_ans',
+            how='inner'
+        )
+        top_5 = resultado_final.sort_values(
+            by=['crescimento_percentual', 'registro_ans'], ascending=[False, True]
+        ).head(limite)
 
     print("\n--- Query 1: Top 5 Operadoras com Maior Crescimento ---")
     print(top_5[['razao_social', 'registro_ans', 'crescimento_percentual']])
-    
+    return top_5
+
 
-        
-def distribuicao_despesas_uf():
+def distribuicao_despesas_uf(fonte="banco", limite=5, ano=None, trimestre=None):
     """Funcao responsavel por fazer um top 5 regioes ( UF ) com as maiores despesas totais"""
-    df = pd.read_sql("despesas_consolidadas", con=engine)
-    
+    if fonte == "banco":
+        consulta = CONSULTA_DESPESAS_POR_UF if cubo_preenchido() else CONSULTA_DESPESAS_POR_UF_LINHAS
+        top_5_uf = executar_analise(consulta, limite=limite, ano=ano, trimestre=trimestre)
+    else:
+        df = ler_tabela("despesas_consolidadas", fonte)
+        if ano is not None:
+            df = df[df['ano'] == ano]
+        if trimestre is not None:
+            df = df[df['trimestre'] == trimestre]
 
-    analise_uf = df.groupby('uf')['valor_despesa'].agg(['sum', 'mean']).reset_index()
-    analise_uf.columns = ['UF', 'Total_Despesas', 'Media_por_Operadora']
+        analise_uf = df.groupby('uf')['valor_despesa'].agg(['sum', 'mean']).reset_index()
+        analise_uf.columns = ['uf', 'total_despesas', 'media_por_operadora']
 
-    top_5_uf = analise_uf.sort_values(by='Total_Despesas', ascending=False).head(5)
+        top_5_uf = analise_uf.sort_values(by='total_despesas', ascending=False).head(limite)
 
     print("\n--- Query 2: Distribuição por UF (Top 5) ---")
     print(top_5_uf)
+    return top_5_uf
 
-def despesas_acima_media_geral():
+
+def despesas_acima_media_geral(fonte="banco", minimo_trimestres=2, ano=None):
     """Funcao responsavel por filtrar as operadoras a cima da media em pelo menos 2 trimestres"""
-    df = pd.read_sql("despesas_consolidadas", con=engine)
-    df_op = pd.read_sql("operadoras", con=engine)
+    if fonte == "banco":
+        consulta = CONSULTA_ACIMA_MEDIA_GERAL if cubo_preenchido() else CONSULTA_ACIMA_MEDIA_GERAL_LINHAS
+        resultado_final = executar_analise(consulta, minimo_trimestres=minimo_trimestres, ano=ano)
+    else:
+        df = ler_tabela("despesas_consolidadas", fonte)
+        df_op = ler_tabela("operadoras", fonte)
+        if ano is not None:
+            df = df[df['ano'] == ano]
 
-    df['valor_despesa'] = pd.to_numeric(df['valor_despesa'], errors='coerce')
-    media_geral = df['valor_despesa'].mean()
+        df['valor_despesa'] = pd.to_numeric(df['valor_despesa'], errors='coerce')
+        media_geral = df['valor_despesa'].mean()
+
+        df_pivot = df.pivot_table(index='registro_ans', columns=['ano', 'trimestre'], values='valor_despesa')
+
+        acima_media = (df_pivot > media_geral).sum(axis=1)
+        resultado = acima_media[acima_media >= minimo_trimestres]
+
+        df_resultado = resultado.reset_index()
+        df_resultado.columns = ['registro_ans', 'quantidade_trimestres']
+
+        resultado_final = pd.merge(
+            df_resultado,
+            df_op[['registro_ans', 'razao_social']],
+            on='registro_ans',
+            how='left'
+        ).sort_values(by=['quantidade_trimestres', 'registro_ans'], ascending=[False, True])
 
-    df_pivot = df.pivot_table(index='registro_ans', columns='trimestre', values='valor_despesa')
-    
-    acima_media = (df_pivot > media_geral).sum(axis=1)
-    resultado = acima_media[acima_media >= 2]
-    
-    df_resultado = resultado.reset_index()
-    df_resultado.columns = ['registro_ans', 'quantidade_trimestres']
-
-    resultado_final = pd.merge(
-        df_resultado,
-        df_op[['registro_ans', 'razao_social']],
-        on='registro_ans',
-        how='left'
-    )
-    
     print("\n--- Query 3: Operadoras acima da média em pelo menos 2 trimestres ---")
-    print(f"Total de operadoras: {len(resultado)}")
+    print(f"Total de operadoras: {len(resultado_final)}")
     print(resultado_final[['razao_social', 'registro_ans', 'quantidade_trimestres']].head())
+    return resultado_final
 
 
 if __name__ == "__main__":
     
     maior_crescimento_operadoras()
     distribuicao_despesas_uf()
-    despesas_acima_media_geral()
\ No newline at end of file
+    despesas_acima_media_geral()
@@ -1,3 +1,14 @@
+-- Razao social sem acento e em minusculas, usada pela busca da API (mesma funcao no termo buscado)
+CREATE OR REPLACE FUNCTION normalizar_busca(texto TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$
+	SELECT lower(translate(
+		texto,
+		'ÁÀÂÃÄáàâãäÉÈÊËéèêëÍÌÎÏíìîïÓÒÔÕÖóòôõöÚÙÛÜúùûüÇçÑñ',
+		'AAAAAaaaaaEEEEeeeeIIIIiiiiOOOOOoooooUUUUuuuuCcNn'
+	))
+$$;
+
 CREATE TABLE IF NOT EXISTS despesas_consolidadas (
 	id SERIAL PRIMARY KEY,
 	cnpj CHAR(14) NOT NULL,
@@ -34,8 +45,8 @@ CREATE TABLE IF NOT EXISTS operadoras (
 	representante VARCHAR(255),
 	cargo_representante VARCHAR(255),
 	regiao_de_comercializacao VARCHAR(255),
-	data_registro_ans DATE
-	
+	data_registro_ans DATE,
+	razao_social_busca TEXT GENERATED ALWAYS AS (normalizar_busca(razao_social)) STORED
 );
 
 CREATE TABLE IF NOT EXISTS dados_agregados(
@@ -44,4 +55,33 @@ CREATE TABLE IF NOT EXISTS dados_agregados(
 	total_geral DECIMAL(20, 2) NOT NULL,
 	media_trimestral DECIMAL(20, 2) NOT NULL,
 	desvio_padrao_despesas DECIMAL(20, 2) NOT NULL
-);
\ No newline at end of file
+);
+
+-- Preenchidas pelo pos_carga.sql ao final de cada recarga
+CREATE TABLE IF NOT EXISTS versao_dados (
+	geracao BIGINT NOT NULL,
+	carregado_em TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Cubo trimestral: totais de cada trimestre por operadora (registro_ans), UF, modalidade e geral (valor NULL).
+-- Com quantidade, soma e soma dos quadrados, media e desvio padrao de qualquer intervalo saem somando trimestres
+CREATE TABLE IF NOT EXISTS cubo_despesas (
+	dimensao VARCHAR(10) NOT NULL,
+	valor TEXT,
+	ano SMALLINT NOT NULL,
+	trimestre SMALLINT NOT NULL,
+	quantidade INTEGER NOT NULL,
+	total_despesas NUMERIC NOT NULL,
+	soma_quadrados NUMERIC NOT NULL
+);
+
+-- Uma linha por combinacao de filtros (NULL = todos), usada pelo /estatisticas
+CREATE TABLE IF NOT EXISTS estatisticas_despesas (
+	ano SMALLINT,
+	trimestre SMALLINT,
+	uf CHAR(2),
+	total_despesas NUMERIC,
+	media_despesas NUMERIC,
+	quantidade INTEGER NOT NULL,
+	top_5_operadoras JSONB NOT NULL
+);
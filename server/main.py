@@ -1,9 +1,29 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from modules.operadoras.route import routes as operadoras_routes
+from modules.operadoras.route import routes as operadoras_routes, aquecer_cache_operadoras
+from modules.despesas.route import routes as despesas_routes
+from modules.analises.route import routes as analises_routes
+from modules.metricas.route import routes as metricas_routes
+from modules.metricas.coletor import MetricasMiddleware, registrar_eventos_banco
+from database.db import async_engine
 
-app = FastAPI()
+registrar_eventos_banco(async_engine.sync_engine)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await aquecer_cache_operadoras()
+    yield
+    await async_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(operadoras_routes, prefix="/api", tags=["Operadoras"])
+app.include_router(despesas_routes, prefix="/api", tags=["Despesas"])
+app.include_router(analises_routes, prefix="/api", tags=["Analises"])
+app.include_router(metricas_routes, tags=["Metricas"])
+app.add_middleware(MetricasMiddleware)
 
 origins = "http://localhost:5173/"
 app.add_middleware(
@@ -12,6 +32,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Next-Cursor", "X-Prev-Cursor"],
 )
 
 @app.get("/")
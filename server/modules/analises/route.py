@@ -0,0 +1,189 @@
+from fastapi import APIRouter, Query, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, tuple_
+from decimal import Decimal, localcontext
+from database.db import get_async_db, async_engine
+from database.querys import (
+    CONSULTA_CRESCIMENTO_OPERADORAS, CONSULTA_DESPESAS_POR_UF, CONSULTA_ACIMA_MEDIA_GERAL,
+    CONSULTA_DESPESAS_POR_UF_LINHAS, CONSULTA_ACIMA_MEDIA_GERAL_LINHAS, CONSULTA_CUBO_PREENCHIDO,
+)
+from modules.operadoras.models import CuboDespesas
+from modules.operadoras.route import ler_cache, gravar_cache, criar_cache_geracao
+from modules.resposta_json import RespostaJSON
+from modules.cache_http import cabecalhos_cache, responder_se_nao_modificado
+
+routes = APIRouter()
+
+LIMITE_MAXIMO_ANALISE = 100
+DIMENSOES_CUBO = ("total", "operadora", "uf", "modalidade")
+PADRAO_PERIODO = r"^\d{4}[Qq][1-4]$"
+
+_cache_analises = criar_cache_geracao()
+_cache_cubo = criar_cache_geracao()
+
+
+async def cubo_preenchido() -> bool:
+    """Funcao responsavel por verificar se a carga atual gerou o cubo trimestral (uma vez por geracao dos dados)"""
+    versao, preenchido = await ler_cache(_cache_analises, "cubo_preenchido")
+    if versao is None:
+        # Sem geracao o banco nao veio do recarregar_dados, entao o pos_carga.sql nao montou o cubo
+        return False
+    if preenchido is None:
+        try:
+            async with async_engine.connect() as connection:
+                preenchido = bool(await connection.scalar(CONSULTA_CUBO_PREENCHIDO))
+        except Exception:
+            preenchido = False
+        gravar_cache(_cache_analises, versao, "cubo_preenchido", preenchido)
+    return preenchido
+
+
+async def executar_analise(db: AsyncSession, consulta, consulta_linhas=None, **parametros) -> list:
+    """Funcao responsavel por servir uma analise do cache da geracao atual ou rodar a consulta no banco.
+
+    consulta_linhas e a versao da analise direto em despesas_consolidadas, usada quando nao ha cubo.
+    """
+    chave = (consulta.text, tuple(sorted(parametros.items())))
+    versao, resultado = await ler_cache(_cache_analises, chave)
+    if resultado is not None:
+        return resultado
+
+    if consulta_linhas is not None and not await cubo_preenchido():
+        consulta = consulta_linhas
+
+    rows = (await db.execute(consulta, parametros)).mappings().all()
+    resultado = [dict(row) for row in rows]
+    gravar_cache(_cache_analises, versao, chave, resultado)
+    return resultado
+
+
+@routes.get("/analises/crescimento-operadoras")
+async def get_operators_growth(
+    db: AsyncSession = Depends(get_async_db),
+    cache: dict = Depends(cabecalhos_cache),
+    limite: int = Query(5, ge=1, le=LIMITE_MAXIMO_ANALISE),
+    uf: str = Query(None, min_length=2, max_length=2)):
+
+    responder_se_nao_modificado(cache)
+    uf = uf.upper() if uf else None
+    return RespostaJSON(await executar_analise(db, CONSULTA_CRESCIMENTO_OPERADORAS, limite=limite, uf=uf), headers=cache)
+
+
+@routes.get("/analises/despesas-por-uf")
+async def get_expenses_by_uf(
+    db: AsyncSession = Depends(get_async_db),
+    cache: dict = Depends(cabecalhos_cache),
+    limite: int = Query(5, ge=1, le=LIMITE_MAXIMO_ANALISE),
+    ano: int = Query(None),
+    trimestre: int = Query(None, ge=1, le=4)):
+
+    responder_se_nao_modificado(cache)
+    return RespostaJSON(await executar_analise(
+        db, CONSULTA_DESPESAS_POR_UF, CONSULTA_DESPESAS_POR_UF_LINHAS, limite=limite, ano=ano, trimestre=trimestre
+    ), headers=cache)
+
+
+@routes.get("/analises/acima-media-geral")
+async def get_operators_above_average(
+    db: AsyncSession = Depends(get_async_db),
+    cache: dict = Depends(cabecalhos_cache),
+    minimo_trimestres: int = Query(2, ge=1),
+    ano: int = Query(None)):
+
+    responder_se_nao_modificado(cache)
+    return RespostaJSON(await executar_analise(
+        db, CONSULTA_ACIMA_MEDIA_GERAL, CONSULTA_ACIMA_MEDIA_GERAL_LINHAS, minimo_trimestres=minimo_trimestres, ano=ano
+    ), headers=cache)
+
+
+def ler_periodo(periodo: str):
+    """Funcao responsavel por converter um trimestre no formato 2024Q1 em (ano, trimestre)"""
+    if not periodo:
+        return None
+    return int(periodo[:4]), int(periodo[5])
+
+
+def resumir_cubo(quantidade: int, total: Decimal, soma_quadrados: Decimal) -> dict:
+    """Funcao responsavel por derivar media e desvio padrao (amostral) da quantidade, soma e soma dos quadrados"""
+    with localcontext() as contexto:
+        # Soma dos quadrados pode ter o dobro de digitos da soma; precisao extra evita perder o desvio na subtracao
+        contexto.prec = 60
+        media = total / quantidade if quantidade else None
+        desvio = None
+        if quantidade > 1:
+            variancia = (soma_quadrados - total * total / quantidade) / (quantidade - 1)
+            desvio = max(variancia, Decimal(0)).sqrt()
+
+    return {
+        "quantidade": quantidade,
+        "total_despesas": float(total),
+        "media_despesas": float(media) if media is not None else None,
+        "desvio_padrao": float(desvio) if desvio is not None else None,
+    }
+
+
+async def consultar_cubo(db: AsyncSession, dimensao: str, valor: str, de: tuple, ate: tuple) -> list:
+    """Funcao responsavel por somar os trimestres do cubo no intervalo pedido, agrupando por valor da dimensao"""
+    query = select(
+        CuboDespesas.valor,
+        CuboDespesas.ano,
+        CuboDespesas.trimestre,
+        CuboDespesas.quantidade,
+        CuboDespesas.total_despesas,
+        CuboDespesas.soma_quadrados
+    ).filter(CuboDespesas.dimensao == dimensao)
+
+    if valor is not None:
+        query = query.filter(CuboDespesas.valor == valor)
+    if de is not None:
+        query = query.filter(tuple_(CuboDespesas.ano, CuboDespesas.trimestre) >= de)
+    if ate is not None:
+        query = query.filter(tuple_(CuboDespesas.ano, CuboDespesas.trimestre) <= ate)
+
+    rows = (await db.execute(query.order_by(CuboDespesas.valor, CuboDespesas.ano, CuboDespesas.trimestre))).all()
+
+    grupos = {}
+    for row in rows:
+        grupo = grupos.setdefault(row.valor, {"quantidade": 0, "total": Decimal(0), "soma_quadrados": Decimal(0), "trimestres": []})
+        grupo["quantidade"] += row.quantidade
+        grupo["total"] += row.total_despesas
+        grupo["soma_quadrados"] += row.soma_quadrados
+        grupo["trimestres"].append({
+            "ano": row.ano,
+            "trimestre": row.trimestre,
+            **resumir_cubo(row.quantidade, row.total_despesas, row.soma_quadrados)
+        })
+
+    resultado = [
+        {"valor": chave, **resumir_cubo(grupo["quantidade"], grupo["total"], grupo["soma_quadrados"]), "trimestres": grupo["trimestres"]}
+        for chave, grupo in grupos.items()
+    ]
+    return sorted(resultado, key=lambda grupo: grupo["total_despesas"], reverse=True)
+
+
+@routes.get("/analises/cubo")
+async def get_expenses_cube(
+    db: AsyncSession = Depends(get_async_db),
+    cache: dict = Depends(cabecalhos_cache),
+    dimensao: str = Query("total", pattern="^(" + "|".join(DIMENSOES_CUBO) + ")$"),
+    valor: str = Query(None, description="Registro ANS, UF ou modalidade; sem valor traz todos da dimensao"),
+    de: str = Query(None, pattern=PADRAO_PERIODO, description="Primeiro trimestre, ex: 2024Q1"),
+    ate: str = Query(None, pattern=PADRAO_PERIODO, description="Ultimo trimestre, ex: 2025Q2"),
+    limite: int = Query(None, ge=1)):
+
+    if dimensao == "total":
+        valor = None
+    elif dimensao == "uf" and valor:
+        valor = valor.upper()
+
+    chave = (dimensao, valor, de and de.upper(), ate and ate.upper())
+    if not await cubo_preenchido():
+        raise HTTPException(status_code=503, detail="Cubo trimestral indisponivel: carregue os dados com recarregar_dados")
+    responder_se_nao_modificado(cache)
+
+    versao, grupos = await ler_cache(_cache_cubo, chave)
+    if grupos is None:
+        grupos = await consultar_cubo(db, dimensao, valor, ler_periodo(de), ler_periodo(ate))
+        gravar_cache(_cache_cubo, versao, chave, grupos)
+
+    return RespostaJSON(grupos[:limite] if limite else grupos, headers=cache)
@@ -0,0 +1,62 @@
+from fastapi import Request, HTTPException
+from email.utils import formatdate, parsedate_to_datetime
+from database.db import versao_dados
+import os
+
+# Tempo que navegador/CDN podem reutilizar a resposta sem revalidar; depois disso revalidam com If-None-Match
+CACHE_HTTP_MAX_AGE = int(os.getenv("CACHE_HTTP_MAX_AGE", "60"))
+
+
+class CabecalhosCache(dict):
+    """Headers de cache da geracao atual; nao_modificado indica se o cliente ja tem essa versao"""
+    nao_modificado = False
+
+
+def etag_confere(if_none_match: str, etag: str) -> bool:
+    """Funcao responsavel pela comparacao fraca do If-None-Match (lista de ETags ou *)"""
+    valores = [valor.strip() for valor in if_none_match.split(",")]
+    return "*" in valores or etag.removeprefix("W/") in [valor.removeprefix("W/") for valor in valores]
+
+
+def nao_modificado_desde(if_modified_since: str, geracao: int) -> bool:
+    try:
+        return parsedate_to_datetime(if_modified_since).timestamp() >= geracao // 1000
+    except (TypeError, ValueError):
+        return False
+
+
+async def cabecalhos_cache(request: Request) -> dict:
+    """Funcao responsavel pelos headers de cache HTTP da geracao atual dos dados.
+
+    Usada como dependencia das rotas de leitura. So marca se o cliente ja tem a versao atual (If-None-Match
+    ou If-Modified-Since); o 304 sai de responder_se_nao_modificado, que a rota chama depois de validar a
+    requisicao e confirmar que o recurso existe.
+    """
+    geracao = await versao_dados()
+    if geracao is None:
+        return CabecalhosCache()
+
+    # A geracao e o instante da carga em milissegundos (pos_carga.sql)
+    cabecalhos = CabecalhosCache({
+        "ETag": f'W/"{geracao}"',
+        "Last-Modified": formatdate(geracao / 1000, usegmt=True),
+        "Cache-Control": f"public, max-age={CACHE_HTTP_MAX_AGE}",
+    })
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        cabecalhos.nao_modificado = etag_confere(if_none_match, cabecalhos["ETag"])
+    else:
+        cabecalhos.nao_modificado = nao_modificado_desde(request.headers.get("if-modified-since"), geracao)
+    return cabecalhos
+
+
+def responder_se_nao_modificado(cabecalhos: dict):
+    """Funcao responsavel pelo 304 sem serializacao quando o cliente ja tem a versao atual.
+
+    A rota chama depois das validacoes (fields, cursor, ...) e da checagem de existencia, entao um pedido
+    invalido continua com 400/422 e um recurso inexistente com 404, mesmo com If-None-Match: *. A
+    existencia vem do cache de operadoras; so uma operadora fora dele custa a consulta antes do 304.
+    """
+    if getattr(cabecalhos, "nao_modificado", False):
+        raise HTTPException(status_code=304, headers=dict(cabecalhos))
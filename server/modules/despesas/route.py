@@ -0,0 +1,87 @@
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from modules.operadoras.models import DespesaConsolidada
+from modules.operadoras.route import CAMPOS_DESPESA, colunas_despesa, normalizar_identificadores
+from database.db import AsyncSessionLocal
+import orjson
+import csv
+import io
+
+routes = APIRouter()
+
+CAMPOS_EXPORTACAO = CAMPOS_DESPESA
+# Linhas buscadas por vez no cursor do servidor; e o maximo que fica em memoria no worker
+TAMANHO_LOTE_EXPORTACAO = 5000
+
+FORMATOS_EXPORTACAO = {
+    "ndjson": ("application/x-ndjson", "despesas.ndjson"),
+    "csv": ("text/csv; charset=utf-8", "despesas.csv"),
+}
+
+
+def consulta_exportacao(ano: int, trimestre: int, uf: str, modalidade: str, cnpjs: list):
+    query = select(*colunas_despesa())
+
+    if ano is not None:
+        query = query.filter(DespesaConsolidada.ano == ano)
+    if trimestre is not None:
+        query = query.filter(DespesaConsolidada.trimestre == trimestre)
+    if uf:
+        query = query.filter(DespesaConsolidada.uf == uf.upper())
+    if modalidade:
+        query = query.filter(DespesaConsolidada.modalidade == modalidade)
+    if cnpjs:
+        query = query.filter(DespesaConsolidada.cnpj.in_(cnpjs))
+
+    # Ordem pela chave primaria: o Postgres le pelo indice e ja comeca a devolver linhas, sem ordenar tudo antes
+    return query.order_by(DespesaConsolidada.id)
+
+
+def formatar_lote_ndjson(rows) -> bytes:
+    return b"".join(orjson.dumps(dict(zip(CAMPOS_EXPORTACAO, row))) + b"\n" for row in rows)
+
+
+def formatar_lote_csv(rows) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer, delimiter=";", lineterminator="\n").writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+async def gerar_exportacao(query, formato: str):
+    """Funcao responsavel por ler a consulta com cursor no servidor e devolver um lote formatado por vez"""
+    if formato == "csv":
+        yield (";".join(CAMPOS_EXPORTACAO) + "\n").encode("utf-8")
+    formatar_lote = formatar_lote_csv if formato == "csv" else formatar_lote_ndjson
+
+    # Sessao propria: precisa ficar aberta ate o ultimo lote, depois que a rota ja retornou
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=TAMANHO_LOTE_EXPORTACAO))
+        async for rows in result.partitions():
+            yield formatar_lote(rows)
+
+
+def separar_cnpjs(cnpj: list) -> list:
+    """Funcao responsavel por aceitar tanto ?cnpj=1&cnpj=2 quanto ?cnpj=1,2, com a pontuacao ignorada como no /operadoras/lote"""
+    cnpjs = []
+    for valor in cnpj or []:
+        cnpjs += valor.split(",")
+    return normalizar_identificadores(cnpjs, 14)
+
+
+@routes.get("/despesas/exportar")
+async def export_expenses(
+    ano: int = Query(None),
+    trimestre: int = Query(None, ge=1, le=4),
+    uf: str = Query(None, min_length=2, max_length=2),
+    modalidade: str = Query(None),
+    cnpj: list[str] = Query(None, description="Um ou mais CNPJs (repetindo o parametro ou separados por virgula)"),
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+
+    query = consulta_exportacao(ano, trimestre, uf, modalidade, separar_cnpjs(cnpj))
+    media_type, nome_arquivo = FORMATOS_EXPORTACAO[formato]
+    return StreamingResponse(
+        gerar_exportacao(query, formato),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}"'},
+    )
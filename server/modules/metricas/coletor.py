@@ -0,0 +1,175 @@
+from contextvars import ContextVar
+from collections import defaultdict
+from sqlalchemy import event
+import threading
+import time
+import os
+
+# Limites (em segundos) dos buckets de latencia das requisicoes e do tempo de banco por requisicao
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+# Requisicoes acima desse tempo sao impressas com o SQL executado (0 desliga)
+LOG_REQUISICOES_LENTAS_MS = float(os.getenv("LOG_REQUISICOES_LENTAS_MS", "0"))
+ROTA_DESCONHECIDA = "desconhecida"
+
+_requisicao_atual = ContextVar("requisicao_atual", default=None)
+_lock = threading.Lock()
+
+
+class Histograma:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.contagens = [0] * len(buckets)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.contagens[i] += 1
+        self.soma += valor
+        self.total += 1
+
+
+_latencia_requisicoes = defaultdict(lambda: Histograma(BUCKETS_LATENCIA))
+_consultas_por_requisicao = defaultdict(lambda: Histograma(BUCKETS_CONSULTAS))
+_tempo_banco_por_requisicao = defaultdict(lambda: Histograma(BUCKETS_LATENCIA))
+_consultas = {"total": 0, "segundos": 0.0}
+
+
+def registrar_eventos_banco(engine):
+    """Funcao responsavel por medir cada consulta do engine e somar na requisicao em andamento"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def antes_da_consulta(conn, cursor, statement, parameters, context, executemany):
+        context._inicio_consulta = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def depois_da_consulta(conn, cursor, statement, parameters, context, executemany):
+        duracao = time.perf_counter() - context._inicio_consulta
+        with _lock:
+            _consultas["total"] += 1
+            _consultas["segundos"] += duracao
+
+        requisicao = _requisicao_atual.get()
+        if requisicao is not None:
+            requisicao["consultas"] += 1
+            requisicao["tempo_banco"] += duracao
+            if requisicao["sql"] is not None:
+                requisicao["sql"].append((duracao, statement))
+
+
+def registrar_requisicao(metodo: str, rota: str, status: int, duracao: float, requisicao: dict):
+    labels = (metodo, rota, str(status))
+    with _lock:
+        _latencia_requisicoes[labels].observar(duracao)
+        _consultas_por_requisicao[labels].observar(requisicao["consultas"])
+        _tempo_banco_por_requisicao[labels].observar(requisicao["tempo_banco"])
+
+    if LOG_REQUISICOES_LENTAS_MS and duracao * 1000 >= LOG_REQUISICOES_LENTAS_MS:
+        print(
+            f"Requisicao lenta: {metodo} {rota} {status} em {duracao * 1000:.0f}ms, "
+            f"{requisicao['consultas']} consultas ({requisicao['tempo_banco'] * 1000:.0f}ms no banco)"
+        )
+        for tempo, statement in requisicao["sql"]:
+            print(f"  [{tempo * 1000:.1f}ms] {' '.join(statement.split())}")
+
+
+def template_rota(scope) -> str:
+    """Funcao responsavel pelo label da rota (/api/operadoras/{cnpj}), para nao criar uma serie por CNPJ"""
+    rota = scope.get("route")
+    if rota is None:
+        return ROTA_DESCONHECIDA
+
+    # O template vem da propria rota; o prefixo do include_router (/api) nem sempre esta no route.path,
+    # entao sai dos segmentos iniciais do caminho, que sao literais. Nunca troca valores dentro do caminho
+    template = rota.path.rstrip("/").split("/")[1:]
+    partes = scope["path"].rstrip("/").split("/")[1:]
+    prefixo = partes[:len(partes) - len(template)]
+    return "/" + "/".join(prefixo + template)
+
+
+class MetricasMiddleware:
+    """Middleware ASGI que mede cada requisicao ate o ultimo byte da resposta (inclusive respostas em streaming)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requisicao = {"consultas": 0, "tempo_banco": 0.0, "sql": [] if LOG_REQUISICOES_LENTAS_MS else None}
+        resposta = {"status": 500}
+        token = _requisicao_atual.set(requisicao)
+        inicio = time.perf_counter()
+
+        async def send_com_status(message):
+            if message["type"] == "http.response.start":
+                resposta["status"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_com_status)
+        finally:
+            _requisicao_atual.reset(token)
+            registrar_requisicao(
+                scope["method"], template_rota(scope), resposta["status"], time.perf_counter() - inicio, requisicao
+            )
+
+
+def escapar_label(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def formatar_histograma(nome: str, descricao: str, series: dict) -> list:
+    linhas = [f"# HELP {nome} {descricao}", f"# TYPE {nome} histogram"]
+    for (metodo, rota, status), histograma in sorted(series.items()):
+        labels = f'method="{metodo}",route="{escapar_label(rota)}",status="{status}"'
+        for limite, contagem in zip(histograma.buckets, histograma.contagens):
+            linhas.append(f'{nome}_bucket{{{labels},le="{limite}"}} {contagem}')
+        linhas.append(f'{nome}_bucket{{{labels},le="+Inf"}} {histograma.total}')
+        linhas.append(f"{nome}_sum{{{labels}}} {histograma.soma}")
+        linhas.append(f"{nome}_count{{{labels}}} {histograma.total}")
+    return linhas
+
+
+def gerar_metricas(pool, cache_operadoras) -> str:
+    """Funcao responsavel por exportar as metricas no formato texto do Prometheus"""
+    with _lock:
+        linhas = formatar_histograma(
+            "http_request_duration_seconds", "Latencia das requisicoes por rota", _latencia_requisicoes
+        )
+        linhas += formatar_histograma(
+            "http_request_db_queries", "Consultas ao banco por requisicao", _consultas_por_requisicao
+        )
+        linhas += formatar_histograma(
+            "http_request_db_duration_seconds", "Tempo gasto no banco por requisicao", _tempo_banco_por_requisicao
+        )
+        linhas += [
+            "# HELP db_queries_total Consultas executadas pelo engine da API",
+            "# TYPE db_queries_total counter",
+            f"db_queries_total {_consultas['total']}",
+            "# HELP db_query_duration_seconds_total Tempo total das consultas do engine da API",
+            "# TYPE db_query_duration_seconds_total counter",
+            f"db_query_duration_seconds_total {_consultas['segundos']}",
+        ]
+
+    for nome, descricao, valor in (
+        ("db_pool_size", "Conexoes permanentes do pool", pool.size()),
+        ("db_pool_checked_out", "Conexoes em uso", pool.checkedout()),
+        ("db_pool_checked_in", "Conexoes livres no pool", pool.checkedin()),
+        ("db_pool_overflow", "Conexoes alem do pool_size (negativo enquanto o pool nao encheu)", pool.overflow()),
+    ):
+        linhas += [f"# HELP {nome} {descricao}", f"# TYPE {nome} gauge", f"{nome} {valor}"]
+
+    for nome, tipo, descricao, valor in (
+        ("operadoras_cache_hits_total", "counter", "Buscas de operadora respondidas pelo cache", cache_operadoras.acertos),
+        ("operadoras_cache_misses_total", "counter", "Buscas de operadora que foram ao banco", cache_operadoras.falhas),
+        ("operadoras_cache_entries", "gauge", "Chaves (CNPJ e registro ANS) no cache de operadoras", len(cache_operadoras)),
+    ):
+        linhas += [f"# HELP {nome} {descricao}", f"# TYPE {nome} {tipo}", f"{nome} {valor}"]
+
+    return "\n".join(linhas) + "\n"
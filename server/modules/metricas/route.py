@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from .coletor import gerar_metricas
+from modules.operadoras.cache import cache_operadoras
+from database.db import async_engine
+
+routes = APIRouter()
+
+
+@routes.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(gerar_metricas(async_engine.sync_engine.pool, cache_operadoras), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,44 @@
+from collections import OrderedDict
+import os
+
+# Entradas do cache de operadoras (cada operadora ocupa duas: CNPJ e registro ANS)
+OPERADORAS_CACHE_MAX = int(os.getenv("OPERADORAS_CACHE_MAX", "20000"))
+
+
+class CacheLRU:
+    """Cache em memoria com tamanho limitado: ao passar do limite descarta o item usado ha mais tempo.
+
+    Guarda tambem a geracao dos dados que preencheu o cache, para ser limpo quando ela muda (recarga).
+    """
+
+    def __init__(self, tamanho_maximo: int):
+        self.tamanho_maximo = tamanho_maximo
+        self.itens = OrderedDict()
+        self.versao = None
+        self.acertos = 0
+        self.falhas = 0
+
+    def __len__(self):
+        return len(self.itens)
+
+    def obter(self, chave):
+        """Funcao responsavel por devolver (encontrado, valor), contando acerto/falha; None tambem e um valor valido"""
+        if chave not in self.itens:
+            self.falhas += 1
+            return False, None
+        self.itens.move_to_end(chave)
+        self.acertos += 1
+        return True, self.itens[chave]
+
+    def gravar(self, chave, valor):
+        self.itens[chave] = valor
+        self.itens.move_to_end(chave)
+        while len(self.itens) > self.tamanho_maximo:
+            self.itens.popitem(last=False)
+
+    def limpar(self, versao):
+        self.itens.clear()
+        self.versao = versao
+
+
+cache_operadoras = CacheLRU(OPERADORAS_CACHE_MAX)
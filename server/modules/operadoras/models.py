@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Date, CHAR, DECIMAL, SmallInteger
+from sqlalchemy import Column, Integer, String, Date, CHAR, DECIMAL, SmallInteger, Text, Computed, Numeric
+from sqlalchemy.dialects.postgresql import JSONB
 from database.db import Base 
 
 class Operadora(Base):
@@ -25,6 +26,7 @@ class Operadora(Base):
     cargo_representante = Column(String(255))
     regiao_de_comercializacao = Column(String(255))
     data_registro_ans = Column(Date)
+    razao_social_busca = Column(Text, Computed("normalizar_busca(razao_social)"))
 
 class DespesaConsolidada(Base):
     __tablename__ = "despesas_consolidadas"
@@ -37,4 +39,29 @@ class DespesaConsolidada(Base):
     registro_ans = Column(String(6), nullable=False)
     modalidade = Column(String(50))
     uf = Column(String(2), nullable=False)
-    valor_despesa = Column(DECIMAL(20, 2), nullable=False)
\ No newline at end of file
+    valor_despesa = Column(DECIMAL(20, 2), nullable=False)
+
+class EstatisticaDespesas(Base):
+    __tablename__ = "estatisticas_despesas"
+    __mapper_args__ = {"primary_key": ["ano", "trimestre", "uf"]}
+
+    ano = Column(SmallInteger)
+    trimestre = Column(SmallInteger)
+    uf = Column(String(2))
+    total_despesas = Column(Numeric)
+    media_despesas = Column(Numeric)
+    quantidade = Column(Integer, nullable=False)
+    top_5_operadoras = Column(JSONB, nullable=False)
+
+
+class CuboDespesas(Base):
+    __tablename__ = "cubo_despesas"
+    __mapper_args__ = {"primary_key": ["dimensao", "valor", "ano", "trimestre"]}
+
+    dimensao = Column(String(10), nullable=False)
+    valor = Column(Text)
+    ano = Column(SmallInteger, nullable=False)
+    trimestre = Column(SmallInteger, nullable=False)
+    quantidade = Column(Integer, nullable=False)
+    total_despesas = Column(Numeric, nullable=False)
+    soma_quadrados = Column(Numeric, nullable=False)
@@ -1,80 +1,401 @@
-from fastapi import APIRouter, Query, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from .models import Operadora, DespesaConsolidada
-from .schema import OperadoraResponse, DespesaConsolidadaSchema, EstatisticasResponse
-from database.db import get_db
+from fastapi import APIRouter, Query, Depends, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, exists, tuple_, case, literal, cast, Float
+import base64
+import json
+import re
+from .models import Operadora, DespesaConsolidada, EstatisticaDespesas
+from .schema import OperadoraResponse, DespesaConsolidadaSchema, EstatisticasResponse, OperadorasLoteRequest
+from .cache import cache_operadoras, OPERADORAS_CACHE_MAX
+from database.db import get_async_db, versao_dados, AsyncSessionLocal
+from modules.resposta_json import RespostaJSON
+from modules.cache_http import cabecalhos_cache, responder_se_nao_modificado
 
 routes = APIRouter()
 
-@routes.get("/operadoras", response_model=list[OperadoraResponse])
+STATUS_COM_DESPESAS = "Ativa com despesas"
+STATUS_SEM_DESPESAS = "Sem despesas registradas"
+
+# Campos na mesma ordem do OperadoraResponse/DespesaConsolidadaSchema; fields= escolhe um subconjunto deles
+CAMPOS_OPERADORA = list(OperadoraResponse.model_fields)
+CAMPOS_DESPESA = list(DespesaConsolidadaSchema.model_fields)
+
+# Ordem estavel da listagem, coberta pelo indice (razao_social, id) criado na carga; com busca, vem depois da relevancia
+ORDEM_OPERADORAS = (Operadora.razao_social, Operadora.id)
+CACHE_MAX_CHAVES = 1000
+
+
+def criar_cache_geracao() -> dict:
+    """Funcao responsavel por um cache por geracao: a geracao fica fora dos itens, longe das chaves vindas da requisicao"""
+    return {"versao": None, "itens": {}}
+
+
+# Caches em processo por geracao dos dados (versao_dados): uma recarga no banco os invalida
+_cache_total = criar_cache_geracao()
+_cache_estatisticas = criar_cache_geracao()
+
+
+def campos_solicitados(fields: str) -> list:
+    """Funcao responsavel por validar o fields= e devolver os campos na ordem do schema"""
+    if not fields:
+        return CAMPOS_OPERADORA
+
+    campos = {campo.strip() for campo in fields.split(",") if campo.strip()}
+    if not campos:
+        return CAMPOS_OPERADORA
+    invalidos = campos - set(CAMPOS_OPERADORA)
+    if invalidos:
+        raise HTTPException(status_code=400, detail=f"Campos invalidos: {', '.join(sorted(invalidos))}")
+    return [campo for campo in CAMPOS_OPERADORA if campo in campos]
+
+
+def consulta_operadoras_com_status(campos: list = CAMPOS_OPERADORA):
+    """Funcao responsavel por selecionar so as colunas pedidas, com o status resolvido no proprio SELECT"""
+    colunas = []
+    for campo in campos:
+        if campo == "status":
+            tem_despesas = exists().where(DespesaConsolidada.cnpj == Operadora.cnpj)
+            colunas.append(case((tem_despesas, STATUS_COM_DESPESAS), else_=STATUS_SEM_DESPESAS).label("status"))
+        else:
+            colunas.append(getattr(Operadora, campo))
+    return select(*colunas)
+
+
+def colunas_despesa() -> list:
+    # valor_despesa sai do banco ja como double precision, sem converter Decimal por linha
+    return [
+        cast(DespesaConsolidada.valor_despesa, Float).label(campo) if campo == "valor_despesa"
+        else getattr(DespesaConsolidada, campo)
+        for campo in CAMPOS_DESPESA
+    ]
+
+
+def linha_para_dict(campos: list, row) -> dict:
+    # zip para nos campos: as colunas de ordenacao que vem depois ficam de fora
+    return dict(zip(campos, row))
+
+
+def escapar_like(termo: str) -> str:
+    return termo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def termo_cnpj(search: str):
+    """Funcao responsavel por devolver o termo so com digitos quando a busca parece um CNPJ (pontuacao ignorada)"""
+    digitos = re.sub(r"[.\-/\s]", "", search)
+    return digitos if digitos.isdigit() else None
+
+
+def filtrar_busca(query, search: str):
+    """Funcao responsavel pela busca sem acento/caixa na razao social e por prefixo nos CNPJs so com digitos.
+
+    O LIKE '%termo%' sobre razao_social_busca usa o indice trigram quando o pg_trgm esta instalado.
+    """
+    if not search:
+        return query
+
+    termo = func.normalizar_busca(escapar_like(search))
+    condicao = Operadora.razao_social_busca.like(literal("%") + termo + "%", escape="\\")
+
+    digitos = termo_cnpj(search)
+    if digitos:
+        condicao = condicao | Operadora.cnpj.like(f"{digitos}%")
+    return query.filter(condicao)
+
+
+def relevancia_busca(search: str):
+    """Funcao responsavel pela relevancia: CNPJ ou nome comecando pelo termo, depois inicio de palavra, depois o resto"""
+    termo = func.normalizar_busca(escapar_like(search))
+    regras = [
+        (Operadora.razao_social_busca.like(termo + "%", escape="\\"), 0),
+        (Operadora.razao_social_busca.like(literal("% ") + termo + "%", escape="\\"), 1),
+    ]
+
+    digitos = termo_cnpj(search)
+    if digitos:
+        regras.insert(0, (Operadora.cnpj.like(f"{digitos}%"), 0))
+    return case(*regras, else_=2)
+
+
+def ordem_listagem(search: str) -> tuple:
+    """Funcao responsavel pelas colunas de ordenacao: com busca, os mais relevantes vem primeiro"""
+    if search:
+        return (relevancia_busca(search),) + ORDEM_OPERADORAS
+    return ORDEM_OPERADORAS
+
+
+def codificar_cursor(chave: tuple, direcao: str) -> str:
+    """Funcao responsavel por gerar o cursor opaco a partir dos valores de ordenacao da linha"""
+    payload = json.dumps({"k": list(chave), "d": direcao}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str, tamanho_chave: int) -> tuple:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if payload["d"] not in ("proximo", "anterior") or len(payload["k"]) != tamanho_chave:
+            raise ValueError(payload)
+        return tuple(payload["k"]), payload["d"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor invalido")
+
+
+async def paginar_por_cursor(db: AsyncSession, query, ordem: tuple, posicao: tuple, limit: int):
+    """Funcao responsavel pela paginacao keyset: busca limit+1 linhas depois (ou antes) da chave do cursor"""
+    valores, direcao = posicao
+    chave = tuple_(*ordem)
+
+    if direcao == "proximo":
+        rows = (await db.execute(query.filter(chave > tuple_(*valores)).order_by(*ordem).limit(limit + 1))).all()
+        tem_proximo, tem_anterior = len(rows) > limit, True
+        rows = rows[:limit]
+    else:
+        rows = (await db.execute(
+            query.filter(chave < tuple_(*valores)).order_by(*[col.desc() for col in ordem]).limit(limit + 1)
+        )).all()
+        tem_proximo, tem_anterior = True, len(rows) > limit
+        rows = rows[:limit][::-1]
+
+    return rows, tem_proximo, tem_anterior
+
+
+async def ler_cache(cache: dict, chave):
+    """Funcao responsavel por buscar no cache da geracao atual, descartando o que for de cargas anteriores"""
+    versao = await versao_dados()
+    if versao is None:
+        return None, None
+    if cache["versao"] != versao:
+        cache["itens"] = {}
+        cache["versao"] = versao
+    return versao, cache["itens"].get(chave)
+
+
+def gravar_cache(cache: dict, versao, chave, valor):
+    if versao is None or cache["versao"] != versao:
+        return
+    if len(cache["itens"]) >= CACHE_MAX_CHAVES:
+        cache["itens"] = {}
+    cache["itens"][chave] = valor
+
+
+async def cache_operadoras_ativo() -> bool:
+    """Funcao responsavel por limpar o cache de operadoras quando a geracao dos dados muda (recarga)"""
+    versao = await versao_dados()
+    if versao is None:
+        return False
+    if cache_operadoras.versao != versao:
+        cache_operadoras.limpar(versao)
+    return True
+
+
+def gravar_operadora(operadora: dict):
+    cache_operadoras.gravar(("cnpj", operadora["cnpj"]), operadora)
+    cache_operadoras.gravar(("registro_ans", operadora["registro_ans"]), operadora)
+
+
+async def buscar_operadoras(db: AsyncSession, campo: str, valores: list) -> dict:
+    """Funcao responsavel por resolver operadoras por cnpj ou registro_ans (None = nao existe).
+
+    O que esta no cache nao vai ao banco; o resto sai numa unica consulta com IN. Os dicts do cache
+    sao compartilhados, entao quem for alterar a resposta monta um dict novo.
+    """
+    usar_cache = await cache_operadoras_ativo()
+    encontradas = {}
+    pendentes = []
+    for valor in valores:
+        achou, operadora = cache_operadoras.obter((campo, valor)) if usar_cache else (False, None)
+        if achou:
+            encontradas[valor] = operadora
+        else:
+            pendentes.append(valor)
+
+    if pendentes:
+        query = consulta_operadoras_com_status().filter(getattr(Operadora, campo).in_(pendentes))
+        for row in (await db.execute(query.order_by(Operadora.id))).all():
+            operadora = linha_para_dict(CAMPOS_OPERADORA, row)
+            if operadora[campo] in encontradas:
+                continue
+            encontradas[operadora[campo]] = operadora
+            if usar_cache:
+                gravar_operadora(operadora)
+
+        for valor in pendentes:
+            if valor not in encontradas:
+                encontradas[valor] = None
+                if usar_cache:
+                    cache_operadoras.gravar((campo, valor), None)
+    return encontradas
+
+
+async def aquecer_cache_operadoras():
+    """Funcao responsavel por carregar o cadastro de operadoras no cache na subida da API"""
+    try:
+        if not await cache_operadoras_ativo():
+            return
+        async with AsyncSessionLocal() as db:
+            query = consulta_operadoras_com_status().order_by(Operadora.id).limit(OPERADORAS_CACHE_MAX // 2)
+            rows = (await db.execute(query)).all()
+    except Exception as e:
+        print(f"Cache de operadoras nao aquecido: {str(e).splitlines()[0]}")
+        return
+
+    for row in rows:
+        gravar_operadora(linha_para_dict(CAMPOS_OPERADORA, row))
+    print(f"Cache de operadoras aquecido com {len(rows)} operadoras")
+
+
+async def contar_operadoras(db: AsyncSession, search: str) -> int:
+    """Funcao responsavel pelo total da listagem, contado uma vez por busca e por carga dos dados"""
+    versao, total = await ler_cache(_cache_total, search)
+    if total is not None:
+        return total
+
+    total = await db.scalar(filtrar_busca(select(func.count(Operadora.id)), search))
+    gravar_cache(_cache_total, versao, search, total)
+    return total
+
+
+# As rotas abaixo devolvem RespostaJSON ja serializada a partir de colunas tipadas do banco, sem passar por
+# response_model; o responses= so documenta o schema no OpenAPI (com fields= sai um subconjunto dos campos)
+@routes.get("/operadoras", responses={200: {"model": list[OperadoraResponse]}})
 async def get_all_operators(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
+    cache: dict = Depends(cabecalhos_cache),
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
-    search: str = Query(None)):
+    search: str = Query(None),
+    cursor: str = Query(None, description="Cursor de X-Next-Cursor/X-Prev-Cursor; quando informado, ignora page"),
+    fields: str = Query(None, description="Campos separados por virgula, ex: cnpj,razao_social,status")):
     
-    query = db.query(Operadora)
-    
-    if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            (Operadora.razao_social.ilike(search_term)) | 
-            (Operadora.cnpj.ilike(search_term))
-        )
+    campos = campos_solicitados(fields)
+    ordem = ordem_listagem(search)
+    posicao = decodificar_cursor(cursor, len(ordem)) if cursor else None
+    responder_se_nao_modificado(cache)
+
+    # As colunas de ordenacao vao junto no SELECT para montar os cursores
+    query = filtrar_busca(consulta_operadoras_com_status(campos), search).add_columns(*ordem)
     
-    offset = (page - 1) * limit
-    operators = query.offset(offset).limit(limit).all()
+    if posicao:
+        rows, tem_proximo, tem_anterior = await paginar_por_cursor(db, query, ordem, posicao, limit)
+    else:
+        offset = (page - 1) * limit
+        rows = (await db.execute(query.order_by(*ordem).offset(offset).limit(limit + 1))).all()
+        tem_proximo, tem_anterior = len(rows) > limit, page > 1
+        rows = rows[:limit]
+
+    headers = {**cache, "X-Total-Count": str(await contar_operadoras(db, search))}
+    if rows and tem_proximo:
+        headers["X-Next-Cursor"] = codificar_cursor(tuple(rows[-1][len(campos):]), "proximo")
+    if rows and tem_anterior:
+        headers["X-Prev-Cursor"] = codificar_cursor(tuple(rows[0][len(campos):]), "anterior")
     
-    results = []
-    for op in operators:
-        has_expenses = db.query(DespesaConsolidada).filter(DespesaConsolidada.cnpj == op.cnpj).first() is not None
-        status = "Ativa com despesas" if has_expenses else "Sem despesas registradas"
-        
-        op_dict = OperadoraResponse.model_validate(op)
-        op_dict.status = status
-        results.append(op_dict)
-        
-    return results
-
-
-@routes.get("/operadoras/{cnpj}", response_model=OperadoraResponse)
-async def get_operator_by_cnpj(cnpj: str, db: Session = Depends(get_db)):
-    operator = db.query(Operadora).filter(Operadora.cnpj == cnpj).first()
-    if not operator:
+    return RespostaJSON([linha_para_dict(campos, row) for row in rows], headers=headers)
+
+
+@routes.get("/operadoras/{cnpj}", responses={200: {"model": OperadoraResponse}})
+async def get_operator_by_cnpj(
+    cnpj: str,
+    db: AsyncSession = Depends(get_async_db),
+    cache: dict = Depends(cabecalhos_cache),
+    fields: str = Query(None, description="Campos separados por virgula, ex: cnpj,razao_social,status")):
+    campos = campos_solicitados(fields)
+    operadora = (await buscar_operadoras(db, "cnpj", [cnpj]))[cnpj]
+    if operadora is None:
         raise HTTPException(status_code=404, detail="Operadora not found")
-    
-    has_expenses = db.query(DespesaConsolidada).filter(DespesaConsolidada.cnpj == cnpj).first() is not None
-    status = "Ativa com despesas" if has_expenses else "Sem despesas registradas"
-    
-    op_response = OperadoraResponse.model_validate(operator)
-    op_response.status = status
-    return op_response
+    responder_se_nao_modificado(cache)
 
-@routes.get("/operadoras/{cnpj}/despesas", response_model=list[DespesaConsolidadaSchema])
-async def get_operator_expenses(cnpj: str, db: Session = Depends(get_db)):
+    return RespostaJSON({campo: operadora[campo] for campo in campos}, headers=cache)
+
+@routes.get("/operadoras/{cnpj}/despesas", responses={200: {"model": list[DespesaConsolidadaSchema]}})
+async def get_operator_expenses(
+    cnpj: str,
+    db: AsyncSession = Depends(get_async_db),
+    cache: dict = Depends(cabecalhos_cache)):
     
-    operator = db.query(Operadora).filter(Operadora.cnpj == cnpj).first()
-    if not operator:
+    if (await buscar_operadoras(db, "cnpj", [cnpj]))[cnpj] is None:
         raise HTTPException(status_code=404, detail="Operadora not found")
-        
-    expenses = db.query(DespesaConsolidada).filter(DespesaConsolidada.cnpj == cnpj).all()
-    return expenses
+    responder_se_nao_modificado(cache)
 
-@routes.get("/estatisticas", response_model=EstatisticasResponse)
-async def get_statistics(db: Session = Depends(get_db)):
-    total_despesas = db.query(func.sum(DespesaConsolidada.valor_despesa)).scalar() or 0
+    rows = (await db.execute(select(*colunas_despesa()).filter(DespesaConsolidada.cnpj == cnpj))).all()
+    return RespostaJSON([linha_para_dict(CAMPOS_DESPESA, row) for row in rows], headers=cache)
+
+def normalizar_identificadores(valores: list, tamanho: int) -> list:
+    """Funcao responsavel por tirar pontuacao, completar zeros a esquerda e remover repetidos mantendo a ordem"""
+    normalizados = []
+    for valor in valores:
+        digitos = re.sub(r"[.\-/\s]", "", valor)
+        normalizados.append(digitos.zfill(tamanho) if digitos.isdigit() else digitos)
+    return list(dict.fromkeys(valor for valor in normalizados if valor))
+
+
+# Muitos CNPJs/registros ANS de uma vez: as operadoras que nao estao no cache saem numa consulta com IN
+# por tipo de identificador e, com incluir_despesas, mais uma para as despesas de todas elas
+@routes.post("/operadoras/lote")
+async def get_operators_batch(lote: OperadorasLoteRequest, db: AsyncSession = Depends(get_async_db)):
+    campos = campos_solicitados(lote.fields)
+    cnpjs = normalizar_identificadores(lote.cnpjs, 14)
+    registros = normalizar_identificadores(lote.registros_ans, 6)
+
+    por_cnpj = await buscar_operadoras(db, "cnpj", cnpjs) if cnpjs else {}
+    por_registro = await buscar_operadoras(db, "registro_ans", registros) if registros else {}
+
+    # Resposta na ordem da entrada; a mesma operadora pedida por CNPJ e por registro ANS sai uma vez so (pelo id),
+    # mas registros diferentes com o mesmo CNPJ saem todos
+    encontradas = {}
+    for operadora in [por_cnpj[cnpj] for cnpj in cnpjs] + [por_registro[registro] for registro in registros]:
+        if operadora is not None:
+            encontradas.setdefault(operadora["id"], operadora)
+    operadoras = [{campo: operadora[campo] for campo in campos} for operadora in encontradas.values()]
+
+    if lote.incluir_despesas and operadoras:
+        # Despesas pelo CNPJ, como no /operadoras/{cnpj}/despesas
+        despesas_por_cnpj = {operadora["cnpj"]: [] for operadora in encontradas.values()}
+        despesas = (await db.execute(
+            select(*colunas_despesa(), DespesaConsolidada.cnpj.label("cnpj_operadora"))
+            .filter(DespesaConsolidada.cnpj.in_(list(despesas_por_cnpj)))
+            .order_by(DespesaConsolidada.cnpj, DespesaConsolidada.ano, DespesaConsolidada.trimestre)
+        )).all()
+        for row in despesas:
+            despesas_por_cnpj[row.cnpj_operadora].append(linha_para_dict(CAMPOS_DESPESA, row))
+        for operadora, resposta in zip(encontradas.values(), operadoras):
+            resposta["despesas"] = despesas_por_cnpj[operadora["cnpj"]]
+
+    return RespostaJSON({
+        "operadoras": operadoras,
+        "nao_encontrados": {
+            "cnpjs": [cnpj for cnpj in cnpjs if por_cnpj[cnpj] is None],
+            "registros_ans": [registro for registro in registros if por_registro[registro] is None],
+        },
+    })
+
+
+def filtrar_periodo_uf(query, ano: int, trimestre: int, uf: str):
+    if ano is not None:
+        query = query.filter(DespesaConsolidada.ano == ano)
+    if trimestre is not None:
+        query = query.filter(DespesaConsolidada.trimestre == trimestre)
+    if uf is not None:
+        query = query.filter(DespesaConsolidada.uf == uf)
+    return query
+
+
+async def calcular_estatisticas(db: AsyncSession, ano: int, trimestre: int, uf: str) -> dict:
+    """Funcao responsavel por agregar direto em despesas_consolidadas, quando o banco nao tem o resumo da carga"""
+    total_despesas = await db.scalar(
+        filtrar_periodo_uf(select(func.sum(DespesaConsolidada.valor_despesa)), ano, trimestre, uf)
+    ) or 0
     
-    media_despesas = db.query(func.avg(DespesaConsolidada.valor_despesa)).scalar() or 0
+    media_despesas = await db.scalar(
+        filtrar_periodo_uf(select(func.avg(DespesaConsolidada.valor_despesa)), ano, trimestre, uf)
+    ) or 0
     
-    top_5 = db.query(
+    top_5 = (await db.execute(filtrar_periodo_uf(select(
         DespesaConsolidada.registro_ans,
         DespesaConsolidada.razao_social,
         func.sum(DespesaConsolidada.valor_despesa).label("total_despesa")
-    ).group_by(
+    ), ano, trimestre, uf).group_by(
         DespesaConsolidada.registro_ans,
         DespesaConsolidada.razao_social
-    ).order_by(func.sum(DespesaConsolidada.valor_despesa).desc()).limit(5).all()
+    ).order_by(func.sum(DespesaConsolidada.valor_despesa).desc()).limit(5))).all()
     
     formatted_top_5 = [
         {"registro_ans": row.registro_ans, "razao_social": row.razao_social, "total_despesa": row.total_despesa}
@@ -85,4 +406,51 @@ async def get_statistics(db: Session = Depends(get_db)):
         "total_despesas": total_despesas,
         "media_despesas": media_despesas,
         "top_5_operadoras": formatted_top_5
-    }
\ No newline at end of file
+    }
+
+
+async def ler_estatisticas(db: AsyncSession, ano: int, trimestre: int, uf: str) -> dict:
+    """Funcao responsavel por ler a linha pronta do resumo gerado na carga para a combinacao de filtros"""
+    row = (await db.execute(select(
+        EstatisticaDespesas.total_despesas,
+        EstatisticaDespesas.media_despesas,
+        EstatisticaDespesas.top_5_operadoras
+    ).filter(
+        EstatisticaDespesas.ano.is_not_distinct_from(ano),
+        EstatisticaDespesas.trimestre.is_not_distinct_from(trimestre),
+        EstatisticaDespesas.uf.is_not_distinct_from(uf)
+    ).limit(1))).first()
+
+    if not row:
+        return {"total_despesas": 0, "media_despesas": 0, "top_5_operadoras": []}
+    return {
+        "total_despesas": row.total_despesas or 0,
+        "media_despesas": row.media_despesas or 0,
+        "top_5_operadoras": row.top_5_operadoras
+    }
+
+
+@routes.get("/estatisticas", response_model=EstatisticasResponse)
+async def get_statistics(
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    cache: dict = Depends(cabecalhos_cache),
+    ano: int = Query(None),
+    trimestre: int = Query(None, ge=1, le=4),
+    uf: str = Query(None, min_length=2, max_length=2)):
+
+    responder_se_nao_modificado(cache)
+    response.headers.update(cache)
+    uf = uf.upper() if uf else None
+    chave = (ano, trimestre, uf)
+    versao, estatisticas = await ler_cache(_cache_estatisticas, chave)
+    if estatisticas is not None:
+        return estatisticas
+
+    # Sem geracao o banco nao veio do recarregar_dados e pode nao ter o resumo
+    if versao is None:
+        return await calcular_estatisticas(db, ano, trimestre, uf)
+
+    estatisticas = await ler_estatisticas(db, ano, trimestre, uf)
+    gravar_cache(_cache_estatisticas, versao, chave, estatisticas)
+    return estatisticas
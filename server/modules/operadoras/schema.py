@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import date
 from typing import Optional
 
@@ -52,4 +52,13 @@ class TopOperator(BaseModel):
 class EstatisticasResponse(BaseModel):
     total_despesas: float
     media_despesas: float
-    top_5_operadoras: list[TopOperator]
\ No newline at end of file
+    top_5_operadoras: list[TopOperator]
+
+# Identificadores por chamada do /operadoras/lote
+LOTE_MAXIMO = 1000
+
+class OperadorasLoteRequest(BaseModel):
+    cnpjs: list[str] = Field(default_factory=list, max_length=LOTE_MAXIMO)
+    registros_ans: list[str] = Field(default_factory=list, max_length=LOTE_MAXIMO)
+    incluir_despesas: bool = False
+    fields: Optional[str] = None
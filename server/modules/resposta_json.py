@@ -0,0 +1,11 @@
+from fastapi.responses import Response
+import orjson
+
+
+class RespostaJSON(Response):
+    """Resposta JSON serializada com orjson a partir de dicts/listas ja prontos, sem passar pelo response_model"""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
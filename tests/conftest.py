@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# Os modulos do ETL e do servidor sao importados como nos scripts, rodando de dentro da propria pasta
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR / "etl"))
+sys.path.insert(0, str(BASE_DIR / "server"))
@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import extraction
+
+# Listagem no formato do PDA: pastas por ano nas demonstracoes e os arquivos dentro de cada secao
+ARQUIVOS_PDA = {
+    "/demonstracoes_contabeis/2024/1T2024.zip": os.urandom(300_000),
+    "/demonstracoes_contabeis/2024/2T2024.zip": os.urandom(200_000),
+    "/demonstracoes_contabeis/2024/3T2024.zip": os.urandom(100_000),
+    "/operadoras/Relatorio_cadop.csv": b"REGISTRO_OPERADORA;CNPJ\n123456;00000000000191\n" * 1000,
+}
+PASTAS_PDA = {
+    "/demonstracoes_contabeis/": ["2023/", "2024/"],
+    "/demonstracoes_contabeis/2023/": [],
+}
+ATRASO_ARQUIVO = 0.05
+
+
+def etag_arquivo(conteudo: bytes) -> str:
+    return f'"{hashlib.sha256(conteudo).hexdigest()[:16]}"'
+
+
+def listar_pasta(caminho: str) -> list:
+    if caminho in PASTAS_PDA:
+        return PASTAS_PDA[caminho]
+    return [nome[len(caminho):] for nome in ARQUIVOS_PDA if nome.startswith(caminho)]
+
+
+class ServidorPDA(BaseHTTPRequestHandler):
+    """Servidor do PDA para os testes: ETag/If-None-Match, Range/If-Range e registro das requisicoes"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        servidor = self.server
+        if self.path.endswith("/"):
+            linhas = "".join(f'<tr><td><a href="{nome}">{nome}</a></td></tr>' for nome in listar_pasta(self.path))
+            corpo = f"<html><body><table>{linhas}</table></body></html>".encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+            return
+
+        conteudo = ARQUIVOS_PDA.get(self.path)
+        if conteudo is None:
+            self.send_error(404)
+            return
+
+        with servidor.lock:
+            servidor.simultaneos += 1
+            servidor.max_simultaneos = max(servidor.max_simultaneos, servidor.simultaneos)
+        try:
+            time.sleep(ATRASO_ARQUIVO)
+            self.responder_arquivo(conteudo)
+        finally:
+            with servidor.lock:
+                servidor.simultaneos -= 1
+
+    def responder_arquivo(self, conteudo: bytes):
+        etag = etag_arquivo(conteudo)
+        intervalo = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+
+        if self.headers.get("If-None-Match") == etag:
+            self.registrar(304)
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        inicio = 0
+        if intervalo and if_range == etag:
+            inicio = int(intervalo.removeprefix("bytes=").rstrip("-"))
+
+        corpo = conteudo[inicio:]
+        status = 206 if inicio else 200
+        self.registrar(status)
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(corpo)))
+        if inicio:
+            self.send_header("Content-Range", f"bytes {inicio}-{len(conteudo) - 1}/{len(conteudo)}")
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def registrar(self, status: int):
+        with self.server.lock:
+            self.server.requisicoes.append((self.path, status, self.headers.get("Range")))
+
+
+@pytest.fixture
+def servidor_pda():
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), ServidorPDA)
+    servidor.lock = threading.Lock()
+    servidor.requisicoes = []
+    servidor.simultaneos = 0
+    servidor.max_simultaneos = 0
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    yield servidor, f"http://127.0.0.1:{servidor.server_address[1]}"
+    servidor.shutdown()
+    servidor.server_close()
+
+
+@pytest.fixture
+def pastas_download(tmp_path, monkeypatch):
+    """Redireciona data/zip, data/csv e o manifesto de downloads para uma pasta temporaria"""
+    pasta_zip, pasta_csv = tmp_path / "zip", tmp_path / "csv"
+    pasta_zip.mkdir()
+    pasta_csv.mkdir()
+    monkeypatch.setattr(extraction, "FILE_ZIP_FOLDER", str(pasta_zip))
+    monkeypatch.setattr(extraction, "FILE_CSV_FOLDER", str(pasta_csv))
+    monkeypatch.setattr(extraction, "FILE_DOWNLOAD_MANIFEST", str(tmp_path / "downloads.json"))
+    return pasta_zip, pasta_csv
+
+
+def baixar_tudo(url: str, max_downloads: int = 2):
+    asyncio.run(extraction.buscar_dados_ans_http(
+        f"{url}/demonstracoes_contabeis", f"{url}/operadoras", max_downloads=max_downloads
+    ))
+
+
+def test_primeiro_download_e_304_na_segunda_execucao(servidor_pda, pastas_download):
+    servidor, url = servidor_pda
+    pasta_zip, pasta_csv = pastas_download
+
+    baixar_tudo(url, max_downloads=2)
+
+    for caminho, conteudo in ARQUIVOS_PDA.items():
+        nome = caminho.rsplit("/", 1)[1]
+        pasta = pasta_csv if nome.endswith(".csv") else pasta_zip
+        assert (pasta / nome).read_bytes() == conteudo
+    assert not list(pasta_zip.glob("*.part"))
+    assert {status for _, status, _ in servidor.requisicoes} == {200}
+    assert servidor.max_simultaneos <= 2
+
+    with open(extraction.FILE_DOWNLOAD_MANIFEST, encoding="utf-8") as f:
+        manifesto = json.load(f)
+    assert manifesto["1T2024.zip"]["etag"] == etag_arquivo(ARQUIVOS_PDA["/demonstracoes_contabeis/2024/1T2024.zip"])
+
+    mtimes = {arquivo: arquivo.stat().st_mtime_ns for arquivo in [*pasta_zip.iterdir(), *pasta_csv.iterdir()]}
+    servidor.requisicoes.clear()
+    baixar_tudo(url, max_downloads=2)
+
+    assert len(servidor.requisicoes) == len(ARQUIVOS_PDA)
+    assert {status for _, status, _ in servidor.requisicoes} == {304}
+    assert {arquivo: arquivo.stat().st_mtime_ns for arquivo in mtimes} == mtimes
+
+
+def test_downloads_limitados_pela_concorrencia(servidor_pda, pastas_download):
+    servidor, url = servidor_pda
+
+    baixar_tudo(url, max_downloads=1)
+
+    assert servidor.max_simultaneos == 1
+
+
+def test_retoma_arquivo_parcial_com_if_range(servidor_pda, pastas_download):
+    servidor, url = servidor_pda
+    pasta_zip, _ = pastas_download
+    caminho = "/demonstracoes_contabeis/2024/1T2024.zip"
+    conteudo = ARQUIVOS_PDA[caminho]
+    (pasta_zip / "1T2024.zip.part").write_bytes(conteudo[:120_000])
+
+    session = extraction.criar_sessao_http(1)
+    validadores = extraction.baixar_arquivo_http(
+        session, f"{url}{caminho}", "1T2024.zip", {"etag_parcial": etag_arquivo(conteudo)}
+    )
+
+    assert servidor.requisicoes == [(caminho, 206, "bytes=120000-")]
+    assert (pasta_zip / "1T2024.zip").read_bytes() == conteudo
+    assert not (pasta_zip / "1T2024.zip.part").exists()
+    assert validadores["etag"] == etag_arquivo(conteudo)
+
+
+def test_parcial_de_outra_versao_baixa_o_arquivo_inteiro(servidor_pda, pastas_download):
+    servidor, url = servidor_pda
+    pasta_zip, _ = pastas_download
+    caminho = "/demonstracoes_contabeis/2024/2T2024.zip"
+    (pasta_zip / "2T2024.zip.part").write_bytes(b"versao antiga")
+
+    session = extraction.criar_sessao_http(1)
+    extraction.baixar_arquivo_http(session, f"{url}{caminho}", "2T2024.zip", {"etag_parcial": '"antigo"'})
+
+    assert servidor.requisicoes == [(caminho, 200, "bytes=13-")]
+    assert (pasta_zip / "2T2024.zip").read_bytes() == ARQUIVOS_PDA[caminho]